@@ -1,6 +1,10 @@
 """Class containing AI vs AI functions."""
+import threading
+
 from mcts import MonteCarloTreeSearch, TreeNode
 from config import CFG
+from evaluate import Evaluate
+from othello.openings import GameCache, opening_schedule
 
 
 class AIplayer(object):
@@ -33,38 +37,24 @@ class AIplayer(object):
         losses = 0
         draws = 0 
 
+        schedule = opening_schedule(game, CFG.num_eval_games,
+                                    CFG.opening_plies)
+        cache = GameCache() if CFG.skip_duplicate_games else None
+        # The results are counted from the first network's perspective.
+        evaluator = Evaluate(current_mcts=AIreversi1, eval_mcts=AIreversi2,
+                             game=self.game)
+        stop = threading.Event()
+
         # Self-play loop
-        for i in range(CFG.num_eval_games):
+        for i, (opening, player) in enumerate(schedule):
             print("Start Game:", i, "\n")
 
-            game = self.game.clone()  # Create a fresh clone for each game.
-            game_over = False
-            value = 0
-            node = TreeNode()
-
-            player = game.current_player
-
-            # Keep playing until the game is in a terminal state.
-            while not game_over:
-                # MCTS simulations to get the best child node.
-                # If player_to_eval is 1 play using the current network
-                # Else play using the evaluation network.
-                if game.current_player == -1:
-                    best_child = AIreversi1.search(game, node, CFG.temp_final)
-                else:
-                    best_child = AIreversi2.search(game, node, CFG.temp_final)
-
-                action = best_child.action
-                game.play_action(action)  # Play the child node's action.
+            value = evaluator.play_game(AIreversi1, AIreversi2, player, stop,
+                                        opening, cache, verbose=True)
 
-                game.print_board()
-
-                game_over, value = game.check_game_over(player)
-
-                best_child.parent = None
-                node = best_child  # Make the child node the root node.
-
-            if value == 1:
+            if value is None:
+                print("duplicate game skipped")
+            elif value == 1:
                 print("win")
                 wins += 1
             elif value == -1:
@@ -78,6 +68,8 @@ class AIplayer(object):
         print("win = ",wins)
         print("lose = ",losses)
         print("draw = ",draws)
-        win_r = wins/CFG.num_eval_games
+        if cache is not None:
+            print("duplicate games skipped = ", cache.skipped)
+            print("transposed games = ", cache.transposed)
+        win_r = wins / max(wins + losses + draws, 1)
         print("win_ratio",win_r)
-
@@ -0,0 +1,270 @@
+"""Asynchronous actor, learner and gatekeeper training pipeline."""
+import glob
+import os
+import time
+
+import numpy as np
+
+from config import CFG
+from replay_buffer import ReplayBuffer, example_dtype, to_records, \
+    write_records
+from selfplay import ResourceMeter, worker_config
+
+
+def read_pointer(directory, name):
+    """Reads a version number written by write_pointer.
+
+    Returns:
+        The integer in the file, or None if it does not exist yet.
+    """
+    file_path = os.path.join(directory, name)
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path) as pointer_file:
+        return int(pointer_file.read())
+
+
+def write_pointer(directory, name, version):
+    """Atomically writes a version number other processes poll for."""
+    file_path = os.path.join(directory, name)
+    with open(file_path + ".tmp", "w") as pointer_file:
+        pointer_file.write(str(version))
+    os.replace(file_path + ".tmp", file_path)
+
+
+def apply_config(config):
+    """Copies the CFG values of the main process into a spawned process."""
+    for name, value in config.items():
+        setattr(CFG, name, value)
+
+
+def actor_worker(index, config, directory, stop):
+    """Plays self-play games with the latest accepted network.
+
+    Every finished game is written to the incoming directory, and the
+    accepted network is reloaded between games whenever the gatekeeper
+    promoted a new one.
+
+    Args:
+        index: The index of the actor.
+        config: A dictionary of CFG values from the main process.
+        directory: The directory shared by the pipeline processes.
+        stop: A multiprocessing Event set when the run is over.
+    """
+    apply_config(config)
+
+    # Imported here so that TensorFlow is only loaded in the worker.
+    from neural_net import NeuralNetworkWrapper
+    from othello.othello_game import OthelloGame
+    from train import Train
+
+    game = OthelloGame()
+    net = NeuralNetworkWrapper(game)
+    trainer = Train(game, net)
+    dtype = example_dtype(game.row, game.column, game.action_size)
+    version = None
+    game_number = 0
+
+    while not stop.is_set():
+        best = read_pointer(directory, "best")
+        if best != version:
+            version = best
+            net.load_model(os.path.join(directory, "best_%d" % version))
+            net.prepare_inference()
+            trainer.network_id = version
+
+        training_data = []
+        trainer.play_game(game.clone(), training_data)
+        write_records(os.path.join(directory, "incoming",
+                                   "actor%d_%06d.npy" % (index, game_number)),
+                      to_records(training_data, dtype))
+        game_number += 1
+
+
+def gatekeeper_worker(config, directory, stop):
+    """Evaluates the newest candidate against the accepted network.
+
+    Candidates which win more than CFG.eval_win_rate of the games are
+    promoted to the next accepted version, the others are written to the
+    rejected pointer. Candidates written while an evaluation runs are
+    skipped in favour of the newest one.
+
+    Args:
+        config: A dictionary of CFG values from the main process.
+        directory: The directory shared by the pipeline processes.
+        stop: A multiprocessing Event set when the run is over.
+    """
+    apply_config(config)
+
+    # Imported here so that TensorFlow is only loaded in the worker.
+    from evaluate import Evaluate
+    from mcts import MonteCarloTreeSearch
+    from neural_net import NeuralNetworkWrapper
+    from othello.othello_game import OthelloGame
+
+    game = OthelloGame()
+    candidate_net = NeuralNetworkWrapper(game)
+    best_net = NeuralNetworkWrapper(game)
+    gated = None
+
+    while not stop.is_set():
+        candidate = read_pointer(directory, "candidate")
+        if candidate is None or candidate == gated:
+            time.sleep(0.5)
+            continue
+
+        best = read_pointer(directory, "best")
+        candidate_net.load_model(os.path.join(directory,
+                                              "candidate_%d" % candidate))
+        best_net.load_model(os.path.join(directory, "best_%d" % best))
+        candidate_net.prepare_inference()
+        best_net.prepare_inference()
+
+        evaluator = Evaluate(current_mcts=MonteCarloTreeSearch(candidate_net),
+                             eval_mcts=MonteCarloTreeSearch(best_net),
+                             game=game)
+        if CFG.sprt_gating:
+            accepted, wins, losses, draws = evaluator.gate()
+        else:
+            wins, losses, draws = evaluator.evaluate()
+            accepted = wins / max(wins + losses + draws, 1) > \
+                CFG.eval_win_rate
+        print("Gatekeeper: candidate %d wins %d, losses %d, draws %d"
+              % (candidate, wins, losses, draws))
+
+        if accepted:
+            candidate_net.save_checkpoint(os.path.join(directory,
+                                                       "best_%d" % (best + 1)))
+            candidate_net.save_model("best_model")
+            write_pointer(directory, "best", best + 1)
+            print("Gatekeeper: candidate %d accepted as version %d"
+                  % (candidate, best + 1))
+        else:
+            write_pointer(directory, "rejected", candidate)
+
+        gated = candidate
+        write_pointer(directory, "gated", gated)
+
+
+class AsyncTrain(object):
+    """Trains with self-play, learning and gating running at the same time.
+
+    Actor processes keep playing games with the latest accepted network and
+    write them to disk. The learner in this process ingests them into a
+    replay buffer and trains a candidate after every CFG.num_games new
+    games, and a gatekeeper process evaluates the candidates in the
+    background. When a candidate is rejected, the learner goes back to the
+    accepted weights. The processes only share files in directory.
+
+    Attributes:
+        game: An object containing the game state.
+        net: The learner's network.
+        directory: The directory shared by the pipeline processes.
+    """
+
+    def __init__(self, game, net):
+        """Initializes AsyncTrain with the board state and neural network."""
+        self.game = game
+        self.net = net
+        self.directory = os.path.join(CFG.model_directory, "async")
+
+    def start(self):
+        """Runs CFG.num_iterations learner steps and waits for their gating."""
+        import multiprocessing
+
+        incoming = os.path.join(self.directory, "incoming")
+        if not os.path.exists(incoming):
+            os.makedirs(incoming)
+        # Games left by an interrupted run would be overwritten by the
+        # actors, which number their games from 0 again.
+        for file_path in glob.glob(os.path.join(incoming, "*")):
+            os.remove(file_path)
+        for name in ("candidate", "gated", "rejected"):
+            if os.path.exists(os.path.join(self.directory, name)):
+                os.remove(os.path.join(self.directory, name))
+
+        best = read_pointer(self.directory, "best")
+        if best is None:
+            best = 0
+            self.net.save_checkpoint(os.path.join(self.directory, "best_0"))
+            write_pointer(self.directory, "best", best)
+        else:
+            # Resume from the last accepted network.
+            self.net.load_model(os.path.join(self.directory, "best_%d" % best))
+
+        replay = ReplayBuffer(os.path.join(self.directory, "replay"),
+                              CFG.replay_iterations, self.game.row,
+                              self.game.column, self.game.action_size)
+        dtype = example_dtype(self.game.row, self.game.column,
+                              self.game.action_size)
+
+        num_actors = max(CFG.selfplay_workers, 1)
+        config = worker_config(num_actors)
+        # TensorFlow is not fork safe, so every process starts a fresh
+        # interpreter.
+        context = multiprocessing.get_context("spawn")
+        stop = context.Event()
+        processes = [context.Process(target=actor_worker,
+                                     args=(index, config, self.directory,
+                                           stop))
+                     for index in range(num_actors)]
+        processes.append(context.Process(target=gatekeeper_worker,
+                                         args=(config, self.directory, stop)))
+
+        meter = ResourceMeter()
+        for process in processes:
+            process.start()
+
+        num_games = 0
+        rejected = None
+        try:
+            for step in range(CFG.num_iterations):
+                # Wait for enough new games, actors keep playing meanwhile.
+                files = []
+                while len(files) < CFG.num_games:
+                    if not any(process.is_alive() for process in processes):
+                        raise RuntimeError("Pipeline processes exited.")
+                    time.sleep(0.5)
+                    files = sorted(glob.glob(os.path.join(incoming,
+                                                          "*.npy")))
+
+                records = np.concatenate([np.load(file_path)
+                                          for file_path in files])
+                for file_path in files:
+                    os.remove(file_path)
+                num_games += len(files)
+                replay.add_records(records.astype(dtype))
+
+                print("Learner step %d: %d new games, replay buffer %d "
+                      "examples" % (step + 1, len(files), len(replay)))
+
+                # Training goes on from the accepted weights, not from a
+                # candidate the gatekeeper rejected.
+                latest = read_pointer(self.directory, "rejected")
+                if latest != rejected:
+                    rejected = latest
+                    best = read_pointer(self.directory, "best")
+                    print("Learner: candidate %d rejected, continuing from "
+                          "version %d" % (rejected, best))
+                    self.net.load_model(os.path.join(self.directory,
+                                                     "best_%d" % best))
+
+                self.net.train_arrays(*replay.sample(CFG.replay_sample))
+                self.net.save_checkpoint(os.path.join(
+                    self.directory, "candidate_%d" % step))
+                write_pointer(self.directory, "candidate", step)
+
+            # Let the gatekeeper judge the last candidate.
+            while read_pointer(self.directory, "gated") != \
+                    CFG.num_iterations - 1:
+                if not processes[-1].is_alive():
+                    raise RuntimeError("Gatekeeper process exited.")
+                time.sleep(0.5)
+        finally:
+            stop.set()
+            for process in processes:
+                # Actors finish the game they are playing.
+                process.join()
+
+        print("Accepted versions:", read_pointer(self.directory, "best"))
+        meter.report(num_games)
@@ -0,0 +1,337 @@
+"""Micro-benchmarks for the game engine, search and network."""
+import argparse
+import math
+import random
+import time
+
+import numpy as np
+
+from config import CFG
+from mcts import MonteCarloTreeSearch, SearchTree, TreeNode
+from othello.othello_game import OthelloGame
+from othello.vector_othello import VectorOthello
+
+
+def random_positions(count, seed=0):
+    """Plays random games with the bitboard backend and collects positions.
+
+    Args:
+        count: Number of positions to collect.
+        seed: Seed for the random move choice.
+
+    Returns:
+        A list of OthelloGame objects.
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        game = OthelloGame(use_bitboard=True)
+        game_over = False
+        while not game_over and len(positions) < count:
+            positions.append(game.clone())
+            legal_mask, _ = game.get_legal_moves(game.current_player)
+            game.play_action(rng.choice(np.flatnonzero(legal_mask).tolist()))
+            game_over, _ = game.check_game_over(game.current_player)
+    return positions
+
+
+def bench_move_generation(num_positions=200, repeats=5):
+    """Compares positions per second of the array and bitboard backends.
+
+    Each position is scored with one get_legal_moves and one check_game_over
+    call, which is what MCTS does per simulation. The legal move cache is
+    cleared before every call so that each repeat searches again.
+    """
+    positions = random_positions(num_positions)
+    print("backend     positions/sec")
+    for use_bitboard in (False, True):
+        games = []
+        for position in positions:
+            game = OthelloGame(use_bitboard=use_bitboard)
+            game.state = position.state.copy()
+            game.current_player = position.current_player
+            game.bitboards = dict(position.bitboards)
+            game.hash = position.hash
+            games.append(game)
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            for game in games:
+                game.legal_cache = None
+                game.get_legal_moves(game.current_player)
+                game.check_game_over(game.current_player)
+        elapsed = time.perf_counter() - start
+
+        name = "bitboard" if use_bitboard else "array"
+        print("%-10s %14.0f" % (name, len(games) * repeats / elapsed))
+
+
+def bench_vector_env(num_boards=(1, 16, 256, 1024), steps=20):
+    """Measures board moves per second of VectorOthello at several sizes."""
+    rng = np.random.default_rng(0)
+    print("boards      moves/sec")
+    for size in num_boards:
+        vector = VectorOthello(size)
+        start = time.perf_counter()
+        for _ in range(steps):
+            mask = vector.legal_mask()
+            game_over, _ = vector.check_game_over()
+            # Pick a random legal square per board, -1 when there is none.
+            scores = np.where(mask, rng.random(mask.shape), -1.0)
+            squares = np.where(mask.any(axis=1) & ~game_over,
+                               scores.argmax(axis=1), -1)
+            vector.play(squares)
+        elapsed = time.perf_counter() - start
+        print("%-10d %10.0f" % (size, size * steps / elapsed))
+
+
+def select_child_numpy(tree, index):
+    """Scores all children with one NumPy expression."""
+    first = int(tree.first_child[index])
+    last = first + int(tree.num_children[index])
+    uct = tree.Psa[first:last] / (tree.Nsa[first:last] + 1.0)
+    uct *= CFG.c_puct * math.sqrt(tree.Nsa[index])
+    uct += tree.Qsa[first:last]
+    return first + int(uct.argmax())
+
+
+def select_child_loop(tree, index):
+    """Scores the children one by one, as the object tree used to."""
+    first = int(tree.first_child[index])
+    last = first + int(tree.num_children[index])
+
+    highest_uct = -math.inf
+    highest_index = first
+    for child in range(first, last):
+        uct = tree.Qsa[child] + tree.Psa[child] * CFG.c_puct * (
+            math.sqrt(tree.Nsa[index]) / (1 + tree.Nsa[child]))
+        if uct > highest_uct:
+            highest_uct = uct
+            highest_index = child
+    return highest_index
+
+
+def bench_select_child(branching=(4, 8, 12, 15, 20, 30), repeats=20000):
+    """Compares PUCT selection times at typical branching factors."""
+    rng = np.random.default_rng(0)
+    print("children    loop us    numpy us    select_child us")
+    for count in branching:
+        tree = SearchTree()
+        tree.reserve(count)
+        tree.first_child[0] = 1
+        tree.num_children[0] = count
+        tree.size = count + 1
+        tree.Nsa[0] = 400
+        tree.Nsa[1:count + 1] = rng.integers(0, 60, count)
+        tree.Qsa[1:count + 1] = rng.uniform(-1, 1, count)
+        tree.Psa[1:count + 1] = rng.dirichlet(np.ones(count))
+
+        timings = []
+        for select in (select_child_loop, select_child_numpy,
+                       SearchTree.select_child):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                select(tree, 0)
+            timings.append((time.perf_counter() - start) / repeats * 1e6)
+
+        print("%-10d %8.2f %11.2f %18.2f" % ((count,) + tuple(timings)))
+
+
+def bench_batched_search(batch_sizes=(1, 2, 4, 8, 16, 32), num_sims=200):
+    """Measures MCTS simulations per second for each leaf batch size K.
+
+    Uses an untrained network, so only the speed is meaningful.
+    """
+    from neural_net import NeuralNetworkWrapper
+
+    game = OthelloGame()
+    net = NeuralNetworkWrapper(game)
+    net.cache = None
+    net.predict_batch(np.zeros((1, game.row, game.column)))  # Warm up.
+
+    CFG.num_mcts_sims = num_sims
+    CFG.endgame_empties = 0
+    CFG.tt_size = 0
+    print("K           sims/sec")
+    for batch_size in batch_sizes:
+        CFG.mcts_batch_size = batch_size
+        mcts = MonteCarloTreeSearch(net)
+        start = time.perf_counter()
+        mcts.search(game.clone(), TreeNode(), CFG.temp_init)
+        elapsed = time.perf_counter() - start
+        print("%-10d %9.1f" % (batch_size, num_sims / elapsed))
+
+
+def bench_predict_batch(batch_sizes=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+                        repeats=10):
+    """Prints predict_batch latency and throughput for each batch size."""
+    from neural_net import NeuralNetworkWrapper
+
+    game = OthelloGame()
+    net = NeuralNetworkWrapper(game)
+    positions = np.array([position.state for position in
+                          random_positions(max(batch_sizes))],
+                         dtype=np.float32)
+    net.predict_batch(positions[:1])  # Warm up.
+
+    print("batch     latency ms    positions/sec")
+    for batch_size in batch_sizes:
+        states = positions[:batch_size]
+        start = time.perf_counter()
+        for _ in range(repeats):
+            net.predict_batch(states)
+        elapsed = (time.perf_counter() - start) / repeats
+        print("%-8d %11.2f %16.0f" % (batch_size, elapsed * 1e3,
+                                      batch_size / elapsed))
+
+
+def bench_parallel_search(max_workers=8, num_sims=200):
+    """Measures MCTS simulations per second for 1 to N parallel workers."""
+    from neural_net import NeuralNetworkWrapper
+
+    game = OthelloGame()
+    net = NeuralNetworkWrapper(game)
+    net.cache = None
+    net.predict(game.state)  # Warm up.
+
+    CFG.num_mcts_sims = num_sims
+    CFG.endgame_empties = 0
+    CFG.tt_size = 0
+    CFG.mcts_batch_size = 1
+    workers = 1
+    print("workers   tree sims/sec   root sims/sec")
+    while workers <= max_workers:
+        CFG.mcts_workers = workers
+        rates = []
+        for mode in ("tree", "root"):
+            CFG.mcts_parallel = mode
+            mcts = MonteCarloTreeSearch(net)
+            start = time.perf_counter()
+            mcts.search(game.clone(), TreeNode(), CFG.temp_init)
+            rates.append(num_sims / (time.perf_counter() - start))
+        print("%-8d %14.1f %15.1f" % (workers, rates[0], rates[1]))
+        workers *= 2
+
+
+def bench_frozen_graph(batch_sizes=(1, 8, 64), repeats=20, tolerance=1e-4):
+    """Checks the batch-norm folded graph against the training graph and
+    compares their latency.
+
+    The batch normalization statistics of the untrained network are
+    randomized first, so the folding is actually exercised.
+    """
+    import tensorflow.compat.v1 as tf
+    from neural_net import NeuralNetworkWrapper
+
+    game = OthelloGame()
+    net = NeuralNetworkWrapper(game)
+    net.cache = None
+    generator = np.random.RandomState(0)
+    with net.net.graph.as_default():
+        for variable in tf.global_variables():
+            name = variable.op.name
+            if "batch_normalization" in name and "Momentum" not in name:
+                shape = variable.shape.as_list()
+                if name.endswith("variance") or name.endswith("gamma"):
+                    value = generator.uniform(0.5, 1.5, shape)
+                else:
+                    value = generator.normal(0, 0.1, shape)
+                variable.load(value.astype(np.float32), net.sess)
+
+    positions = np.array([position.state for position in
+                          random_positions(max(batch_sizes))],
+                         dtype=np.float32)
+
+    def latencies():
+        results = []
+        for batch_size in batch_sizes:
+            states = positions[:batch_size]
+            net.run_network(states)  # Warm up.
+            start = time.perf_counter()
+            for _ in range(repeats):
+                net.run_network(states)
+            results.append((time.perf_counter() - start) / repeats)
+        return results
+
+    pi, v = net.run_network(positions)
+    original = latencies()
+    net.freeze()
+    frozen_pi, frozen_v = net.run_network(positions)
+    frozen = latencies()
+
+    pi_error = np.abs(pi - frozen_pi).max()
+    v_error = np.abs(v - frozen_v).max()
+    print("max |pi difference| %.2e, max |v difference| %.2e: %s"
+          % (pi_error, v_error,
+             "match" if max(pi_error, v_error) <= tolerance else "MISMATCH"))
+    print("batch   training ms   frozen ms   speedup")
+    for batch_size, before, after in zip(batch_sizes, original, frozen):
+        print("%-7d %11.2f %11.2f %9.2f" % (batch_size, before * 1e3,
+                                            after * 1e3, before / after))
+
+
+def bench_quantized(num_sims=200):
+    """Reports the accuracy and MCTS speed of the quantized networks.
+
+    Uses the best model and the stored self-play positions in
+    CFG.model_directory when they exist. Half of the positions calibrate the
+    int8 model, the other half measure top-1 policy agreement and value
+    error against float32.
+    """
+    import os
+    from neural_net import NeuralNetworkWrapper, load_calibration_states
+
+    game = OthelloGame()
+    net = NeuralNetworkWrapper(game)
+    net.cache = None
+    if os.path.exists(CFG.model_directory + "best_model.meta"):
+        net.load_model(CFG.model_directory + "best_model")
+
+    positions = load_calibration_states()
+    if positions is None:
+        positions = np.array([position.state for position in
+                              random_positions(400)], dtype=np.float32)
+    calibration, held_out = positions[::2], positions[1::2]
+
+    pi, v = net.run_network(held_out)
+
+    CFG.num_mcts_sims = num_sims
+    CFG.endgame_empties = 0
+    CFG.tt_size = 0
+    print("precision   top-1 agreement   mean |v error|   max |v error|"
+          "   sims/sec")
+    for precision in ("float32", "float16", "int8"):
+        if precision == "float32":
+            net.unfreeze()
+        else:
+            net.quantize(calibration, precision)
+        quantized_pi, quantized_v = net.run_network(held_out)
+        agreement = np.mean(pi.argmax(axis=1) == quantized_pi.argmax(axis=1))
+        v_error = np.abs(v - quantized_v)
+
+        mcts = MonteCarloTreeSearch(net)
+        start = time.perf_counter()
+        mcts.search(game.clone(), TreeNode(), CFG.temp_init)
+        rate = num_sims / (time.perf_counter() - start)
+        print("%-11s %15.3f %16.4f %15.4f %10.1f"
+              % (precision, agreement, v_error.mean(), v_error.max(), rate))
+
+
+BENCHMARKS = {
+    "batch": bench_batched_search,
+    "frozen": bench_frozen_graph,
+    "movegen": bench_move_generation,
+    "parallel": bench_parallel_search,
+    "predict": bench_predict_batch,
+    "quantized": bench_quantized,
+    "select": bench_select_child,
+    "vector": bench_vector_env,
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("benchmark",
+                        help="Name of the benchmark to run.",
+                        choices=sorted(BENCHMARKS))
+    arguments = parser.parse_args()
+    BENCHMARKS[arguments.benchmark]()
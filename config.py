@@ -29,6 +29,55 @@ class CFG(object):
         record_loss: Binary to record policy and value loss to a file.
         loss_file: Name of the file to record loss.
         game: Number of the game. 0: Tic Tac Toe, 1: Othello, 2: Connect Four.
+        bitboard: Binary to use the bitboard backend for Othello move logic.
+        tt_size: Number of positions kept in the MCTS transposition table.
+        endgame_empties: Empty squares at which MCTS plays the solved move,
+            0 to always search.
+        mcts_batch_size: Number of leaves evaluated together in one MCTS round.
+        mcts_workers: Number of threads searching in parallel per move.
+        mcts_parallel: Parallel search mode, "tree" or "root".
+        eval_cache_mb: Memory cap in MB of the network evaluation cache,
+            split between the self-play worker processes. 0 disables it.
+        selfplay_workers: Number of processes playing self-play games.
+        pin_cores: Binary to pin each self-play worker to one CPU core.
+        inference_server: Binary to evaluate for all workers in one server.
+        inference_max_batch: Largest batch the inference server evaluates.
+        inference_max_latency_ms: Longest wait for a batch to fill up.
+        inference_timeout_s: Longest wait in seconds for an answer of the
+            inference server before a worker gives up.
+        frozen_inference: Binary to play with a batch-norm folded inference
+            only graph.
+        inference_precision: "float32", or "float16" / "int8" to play with
+            a quantized TFLite model.
+        calibration_states: Number of self-play positions stored to
+            calibrate the int8 model.
+        startup_time: Binary to time startup up to the first AI move and
+            exit.
+        replay_iterations: Number of iterations of self-play positions kept
+            for training.
+        replay_sample: Number of positions sampled from the replay buffer
+            per iteration, 0 for all.
+        batch_symmetries: Binary to apply a random board symmetry to every
+            Othello training example as batches are read.
+        async_training: Binary to run self-play, training and gating at the
+            same time in separate processes.
+        sprt_gating: Binary to gate new networks with parallel evaluation
+            games that stop early on a sequential probability ratio test.
+        eval_workers: Number of evaluation games played at the same time.
+        sprt_max_games: Most evaluation games played when gating, used
+            instead of num_eval_games.
+        sprt_margin: Distance of the SPRT hypotheses from eval_win_rate.
+        sprt_alpha: Probability of accepting a network which is not better.
+        sprt_beta: Probability of rejecting a network which is better.
+        opening_plies: Number of moves of the balanced openings evaluation
+            and AI vs AI games start from, 0 for the initial position.
+        skip_duplicate_games: Binary to skip evaluation and AI vs AI games
+            which repeat an earlier game.
+        record_games: Binary to append every self-play game to a compact
+            binary record file. Off by default, as the files are never
+            pruned.
+        import_records: Glob pattern of game record files replayed into
+            the replay buffer when training starts, empty for none.
     """
     num_iterations = 5
     num_games = 30
@@ -56,3 +105,34 @@ class CFG(object):
     record_loss = 1
     loss_file = "loss.txt"
     game = 1
+    bitboard = 1
+    tt_size = 100000
+    endgame_empties = 0
+    mcts_batch_size = 1
+    mcts_workers = 1
+    mcts_parallel = "tree"
+    eval_cache_mb = 0
+    selfplay_workers = 1
+    pin_cores = 0
+    inference_server = 0
+    inference_max_batch = 64
+    inference_max_latency_ms = 5
+    inference_timeout_s = 120
+    frozen_inference = 0
+    inference_precision = "float32"
+    calibration_states = 500
+    startup_time = 0
+    replay_iterations = 4
+    replay_sample = 0
+    batch_symmetries = 1
+    async_training = 0
+    sprt_gating = 0
+    eval_workers = 4
+    sprt_max_games = 100
+    sprt_margin = 0.1
+    sprt_alpha = 0.05
+    sprt_beta = 0.05
+    opening_plies = 4
+    skip_duplicate_games = 1
+    record_games = 0
+    import_records = ""
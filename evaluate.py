@@ -1,6 +1,38 @@
 "Class to evaluate network."""
+import math
+import threading
+
 from config import CFG
-from mcts import TreeNode
+from mcts import MonteCarloTreeSearch, TreeNode
+from othello.openings import GameCache, opening_schedule
+
+
+def sprt_bounds(alpha, beta):
+    """Returns the lower and upper log-likelihood ratio bounds of an SPRT.
+
+    Args:
+        alpha: The probability of accepting a candidate which is not better.
+        beta: The probability of rejecting a candidate which is better.
+    """
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def sprt_llr(wins, losses, draws, p0, p1):
+    """Computes the log-likelihood ratio of win rate p1 against p0.
+
+    Draws count as half a win and half a loss.
+
+    Args:
+        wins: The number of games won by the candidate.
+        losses: The number of games lost by the candidate.
+        draws: The number of drawn games.
+        p0: The win rate of the hypothesis that the candidate is not better.
+        p1: The win rate of the hypothesis that the candidate is better.
+    """
+    score = wins + draws / 2
+    failures = losses + draws / 2
+    return (score * math.log(p1 / p0) +
+            failures * math.log((1 - p1) / (1 - p0)))
 
 
 class Evaluate(object):
@@ -21,6 +53,9 @@ class Evaluate(object):
     def evaluate(self):
         """Play self-play games between the two networks and record game stats.
 
+        Every opening of the schedule is played with the current network on
+        both colours. Games which repeat an earlier game are skipped.
+
         Returns:
             Wins and losses count from the perspective of the current network.
         """
@@ -28,40 +63,22 @@ class Evaluate(object):
         losses = 0
         draws = 0
 
+        schedule = opening_schedule(self.game, CFG.num_eval_games,
+                                    CFG.opening_plies)
+        cache = GameCache() if CFG.skip_duplicate_games else None
+        stop = threading.Event()
+
         # Self-play loop
-        for i in range(CFG.num_eval_games):
+        for i, (opening, current_player) in enumerate(schedule):
             print("Start Evaluation Self-Play Game:", i, "\n")
 
-            game = self.game.clone()  # Create a fresh clone for each game.
-            game_over = False
-            value = 0
-            node = TreeNode()
-
-            player = game.current_player
-
-            # Keep playing until the game is in a terminal state.
-            while not game_over:
-                # MCTS simulations to get the best child node.
-                # If player_to_eval is 1 play using the current network
-                # Else play using the evaluation network.
-                if game.current_player == 1:
-                    best_child = self.current_mcts.search(game, node,
-                                                          CFG.temp_final)
-                else:
-                    best_child = self.eval_mcts.search(game, node,
-                                                       CFG.temp_final)
-
-                action = best_child.action
-                game.play_action(action)  # Play the child node's action.
+            value = self.play_game(self.current_mcts, self.eval_mcts,
+                                   current_player, stop, opening, cache,
+                                   verbose=True)
 
-                game.print_board()
-
-                game_over, value = game.check_game_over(player)
-
-                best_child.parent = None
-                node = best_child  # Make the child node the root node.
-
-            if value == 1:
+            if value is None:
+                print("duplicate game skipped")
+            elif value == 1:
                 print("win")
                 wins += 1
             elif value == -1:
@@ -72,4 +89,160 @@ class Evaluate(object):
                 draws += 1
             print("\n")
 
+        if cache is not None:
+            print("Duplicate games skipped:", cache.skipped)
+            print("Transposed games:", cache.transposed)
+
         return wins, losses, draws
+
+    def play_game(self, current_mcts, eval_mcts, current_player, stop,
+                  opening=(), cache=None, verbose=False):
+        """Plays one evaluation game.
+
+        Args:
+            current_mcts: The current network's MCTS for this game.
+            eval_mcts: The evaluation network's MCTS for this game.
+            current_player: The colour of the current network, -1 to move
+                first from the initial position.
+            stop: A threading Event which aborts the game when set.
+            opening: The squares of the opening moves played first.
+            cache: A GameCache to skip games repeating earlier ones, or None.
+            verbose: Whether to print the board after every move.
+
+        Returns:
+            The game result for the current network, 1, -1 or 0, or None if
+            the game was aborted or skipped as a duplicate.
+        """
+        game = self.game.clone()  # Create a fresh clone for each game.
+        for square in opening:
+            game.play_action(square)
+
+        game_over, value = game.check_game_over(current_player)
+        node = TreeNode()
+        moves = list(opening)
+        keys = []
+        transposed = False
+
+        while not game_over:
+            if stop.is_set():
+                return None
+
+            if game.current_player == current_player:
+                best_child = current_mcts.search(game, node, CFG.temp_final)
+            else:
+                best_child = eval_mcts.search(game, node, CFG.temp_final)
+
+            game.play_action(best_child.action)
+            moves.append(best_child.action)
+
+            if verbose:
+                game.print_board()
+
+            if cache is not None:
+                key = (game.hash, current_player)
+                # Once the game left the moves of every earlier game it can
+                # no longer be a duplicate, so transpositions are only
+                # counted once and played to the end.
+                if not transposed:
+                    duplicate = cache.lookup(key, moves)
+                    if duplicate:
+                        return None
+                    transposed = duplicate is not None
+                keys.append(key)
+
+            game_over, value = game.check_game_over(current_player)
+
+            best_child.parent = None
+            node = best_child  # Make the child node the root node.
+
+        if cache is not None:
+            cache.add_game(keys, moves)
+
+        return value
+
+    def gate(self):
+        """Decides whether the current network replaces the evaluation one.
+
+        Plays up to CFG.sprt_max_games games on CFG.eval_workers threads,
+        from the openings of the schedule with the current network on both
+        colours, and stops as soon as a sequential probability ratio test
+        decides. Games repeating an earlier game are skipped.
+        If all games are played without a decision, the win rate is compared
+        to CFG.eval_win_rate.
+
+        Returns:
+            Whether the current network is accepted, and its wins, losses
+            and draws.
+        """
+        p0 = CFG.eval_win_rate - CFG.sprt_margin
+        p1 = CFG.eval_win_rate + CFG.sprt_margin
+        lower, upper = sprt_bounds(CFG.sprt_alpha, CFG.sprt_beta)
+
+        schedule = opening_schedule(self.game, CFG.sprt_max_games,
+                                    CFG.opening_plies)
+        cache = GameCache() if CFG.skip_duplicate_games else None
+        lock = threading.Lock()
+        stop = threading.Event()
+        results = {"next": 0, "wins": 0, "losses": 0, "draws": 0,
+                   "decision": None}
+
+        def worker():
+            current_mcts = MonteCarloTreeSearch(self.current_mcts.net)
+            eval_mcts = MonteCarloTreeSearch(self.eval_mcts.net)
+            while True:
+                with lock:
+                    if stop.is_set() or results["next"] >= len(schedule):
+                        return
+                    opening, current_player = schedule[results["next"]]
+                    results["next"] += 1
+
+                value = self.play_game(current_mcts, eval_mcts,
+                                       current_player, stop, opening, cache)
+                if value is None:
+                    # Aborted after a decision, or skipped as a duplicate.
+                    continue
+
+                with lock:
+                    if results["decision"] is not None:
+                        return
+                    if value == 1:
+                        results["wins"] += 1
+                    elif value == -1:
+                        results["losses"] += 1
+                    else:
+                        results["draws"] += 1
+
+                    llr = sprt_llr(results["wins"], results["losses"],
+                                   results["draws"], p0, p1)
+                    if llr >= upper:
+                        results["decision"] = True
+                    elif llr <= lower:
+                        results["decision"] = False
+                    if results["decision"] is not None:
+                        stop.set()
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(max(CFG.eval_workers, 1))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        wins, losses, draws = (results["wins"], results["losses"],
+                               results["draws"])
+        num_games = wins + losses + draws
+        skipped = cache.skipped if cache is not None else 0
+        transposed = cache.transposed if cache is not None else 0
+        accepted = results["decision"]
+        if accepted is None:
+            accepted = num_games > 0 and wins / num_games > CFG.eval_win_rate
+
+        print("Gate: %s after %d of %d games (%d games saved, %d duplicates "
+              "skipped, %d transpositions), wins %d, losses %d, draws %d, "
+              "LLR %.2f in [%.2f, %.2f]"
+              % ("accepted" if accepted else "rejected", num_games,
+                 CFG.sprt_max_games, CFG.sprt_max_games - num_games - skipped,
+                 skipped, transposed, wins, losses, draws,
+                 sprt_llr(wins, losses, draws, p0, p1), lower, upper))
+
+        return accepted, wins, losses, draws
@@ -16,14 +16,37 @@ class Game(object):
         """
         pass
 
-    def play_action(self, action):
+    def play_action(self, action, flipped=None):
         """Plays an action on the game board.
 
         Args:
-            action: A tuple in the form of (row, column).
+            action: A tuple in the form of (row, column), or the integer
+                index of the square played.
+            flipped: An optional precomputed flip set from get_legal_moves.
         """
         pass
 
+    def undo_action(self):
+        """Takes back the last action played on the game board."""
+        pass
+
+    def get_legal_moves(self, current_player):
+        """Returns a fixed-shape legal move mask and the flip set of each move.
+
+        Returns:
+            A uint8 array of length action_size with 1 on legal moves, and a
+            list with the flip set of every move.
+        """
+        pass
+
+    def solve_endgame(self, max_empties, solver=None):
+        """Solves the position exactly if few enough squares are empty.
+
+        Returns:
+            A tuple (action, score), or None if the position is not solved.
+        """
+        return None
+
     def get_valid_moves(self, current_player):
         """Returns a list of moves along with their validity.
 
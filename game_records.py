@@ -0,0 +1,164 @@
+"""Compact binary records of self-play games."""
+import glob
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"OGR1"
+HEADER = struct.Struct("<IbHI")
+PROBABILITY_SCALE = 65535
+
+
+class GameRecordWriter(object):
+    """Appends self-play games to a record file as they finish.
+
+    A file starts with MAGIC, followed by one record per game: a header with
+    the network id, the result for the first player, the number of moves
+    and the number of stored probabilities, then one byte per move with
+    its square, then the search policy of every move over its legal moves
+    only, in square order, as uint16. The legal moves are not stored, the
+    reader finds them again by replaying the moves.
+
+    Attributes:
+        game: An object containing the start position of every game.
+        file_path: The path of the record file.
+        record_file: The open record file.
+    """
+
+    def __init__(self, game, file_path):
+        """Initializes GameRecordWriter and opens the file for appending."""
+        self.game = game
+        self.file_path = file_path
+
+        directory = os.path.dirname(file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.record_file = open(file_path, "ab")
+        if self.record_file.tell() == 0:
+            self.record_file.write(MAGIC)
+
+    def write_game(self, moves, pis, result, network_id):
+        """Appends one game and flushes it to disk.
+
+        Args:
+            moves: The squares played, in order.
+            pis: The search probability vector of every move.
+            result: The game result for the player who moved first.
+            network_id: An integer identifying the network which played.
+        """
+        game = self.game.clone()
+        probabilities = []
+        for square, pi in zip(moves, pis):
+            legal_mask, _ = game.get_legal_moves(game.current_player)
+            probabilities.append(np.asarray(pi)[legal_mask == 1])
+            game.play_action(int(square))
+
+        if probabilities:
+            probabilities = np.concatenate(probabilities)
+        else:
+            probabilities = np.zeros(0)
+        quantized = np.round(np.clip(probabilities, 0, 1) *
+                             PROBABILITY_SCALE).astype("<u2")
+
+        self.record_file.write(HEADER.pack(network_id, int(result),
+                                           len(moves), len(quantized)))
+        self.record_file.write(bytes(bytearray(int(square)
+                                               for square in moves)))
+        self.record_file.write(quantized.tobytes())
+        self.record_file.flush()
+
+    def close(self):
+        """Closes the record file."""
+        self.record_file.close()
+
+
+def read_records(file_path):
+    """Reads the raw records of a file.
+
+    A record cut short by an interrupted run ends the file.
+
+    Args:
+        file_path: The path of the record file.
+
+    Yields:
+        (network id, result, moves, probabilities) tuples, moves as a uint8
+        array and probabilities as the quantized uint16 array of all moves.
+    """
+    with open(file_path, "rb") as record_file:
+        data = record_file.read()
+
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a game record file: %s" % file_path)
+
+    offset = len(MAGIC)
+    while offset + HEADER.size <= len(data):
+        network_id, result, num_moves, num_probabilities = \
+            HEADER.unpack_from(data, offset)
+        offset += HEADER.size
+        end = offset + num_moves + 2 * num_probabilities
+        if end > len(data):
+            break
+
+        moves = np.frombuffer(data, np.uint8, num_moves, offset)
+        probabilities = np.frombuffer(data, "<u2", num_probabilities,
+                                      offset + num_moves)
+        offset = end
+
+        yield network_id, result, moves, probabilities
+
+
+def replay_record(game, moves, probabilities, result):
+    """Rebuilds the training examples of a game by replaying its moves.
+
+    Args:
+        game: An object containing the start position.
+        moves: The squares played, in order.
+        probabilities: The quantized policies of all moves.
+        result: The game result for the player who moved first.
+
+    Returns:
+        A list of [state, pi, v] examples as self-play produces them.
+    """
+    game = game.clone()
+    first_player = game.current_player
+    examples = []
+    offset = 0
+
+    for square in moves:
+        legal_mask, _ = game.get_legal_moves(game.current_player)
+        legal = np.flatnonzero(legal_mask)
+
+        pi = np.zeros(game.action_size)
+        pi[legal] = probabilities[offset:offset + len(legal)]
+        offset += len(legal)
+        total = pi.sum()
+        pi = pi / total if total > 0 else legal_mask / float(len(legal))
+
+        v = result if game.current_player == first_player else -result
+        examples.append([game.state.copy(), pi, v])
+        game.play_action(int(square))
+
+    return examples
+
+
+def read_training_data(game, pattern):
+    """Rebuilds the training examples of every game in matching files.
+
+    Args:
+        game: An object containing the start position.
+        pattern: A glob pattern of record files.
+
+    Returns:
+        A list of [state, pi, v] examples and the number of games read.
+    """
+    training_data = []
+    num_games = 0
+    for file_path in sorted(glob.glob(pattern)):
+        for _, result, moves, probabilities in read_records(file_path):
+            training_data.extend(replay_record(game, moves, probabilities,
+                                               result))
+            num_games += 1
+
+    return training_data, num_games
@@ -50,13 +50,15 @@ class HumanPlay(object):
                     action = (1, action[0], action[1])
 
                 best_child = TreeNode()
-                best_child.action = action
             else:
                 best_child = mcts.search(game, node,
                                          CFG.temp_final)
+                action = best_child.action
 
-            action = best_child.action
-            game.play_action_human(action)  # Play the child node's action.
+            if game.current_player == human_value:
+                game.play_action_human(action)
+            else:
+                game.play_action(action)  # Play the child node's action.
 
             game.print_board()
 
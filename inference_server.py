@@ -0,0 +1,337 @@
+"""Local inference server batching network calls from worker processes."""
+import collections
+import queue
+import time
+
+import numpy as np
+
+from config import CFG
+
+
+def serve(config, model_path, requests, responses, control, replies,
+          stopped):
+    """Runs the inference server loop in its own process.
+
+    Requests are gathered into dynamic batches by gather_batch, then each
+    whole batch is evaluated with one network call.
+
+    Args:
+        config: A dictionary of CFG values from the main process.
+        model_path: The checkpoint path of the network to serve, or None.
+        requests: A queue of (client, sent time, states, players) tuples.
+        responses: A list with one response queue per client.
+        control: A queue of ("load", path), ("stats",) or ("stop",).
+        replies: A queue receiving the answers to control messages.
+        stopped: An event set when the server exits, even on an error, so
+            that waiting clients fail instead of blocking.
+    """
+    try:
+        run_server(config, model_path, requests, responses, control,
+                   replies)
+    finally:
+        stopped.set()
+
+
+def run_server(config, model_path, requests, responses, control, replies):
+    """Loads the network and answers requests until a stop message.
+
+    Args:
+        config: A dictionary of CFG values from the main process.
+        model_path: The checkpoint path of the network to serve, or None.
+        requests: A queue of (client, sent time, states, players) tuples.
+        responses: A list with one response queue per client.
+        control: A queue of ("load", path), ("stats",) or ("stop",).
+        replies: A queue receiving the answers to control messages.
+    """
+    for name, value in config.items():
+        setattr(CFG, name, value)
+
+    # Imported here so that TensorFlow is only loaded in the server.
+    from neural_net import NeuralNetworkWrapper
+    from othello.othello_game import OthelloGame
+
+    net = NeuralNetworkWrapper(OthelloGame())
+    if model_path is not None:
+        net.load_inference_model(model_path)
+
+    max_batch = CFG.inference_max_batch
+    max_latency = CFG.inference_max_latency_ms / 1000.0
+    metrics = ServerMetrics()
+
+    while True:
+        try:
+            message = control.get_nowait()
+        except queue.Empty:
+            message = None
+        if message is not None:
+            if message[0] == "stop":
+                replies.put(metrics.summary(net.cache))
+                return
+            elif message[0] == "load":
+                net.load_inference_model(message[1])
+                replies.put(True)
+            elif message[0] == "stats":
+                replies.put(metrics.summary(net.cache))
+
+        batch, size = gather_batch(requests, max_batch, max_latency)
+        if not batch:
+            continue
+
+        try:
+            metrics.queue_depths.append(requests.qsize())
+        except NotImplementedError:
+            pass
+
+        states = np.concatenate([request[2] for request in batch])
+        players = [player for request in batch for player in request[3]]
+        pis, vs = net.predict_batch(states, players)
+
+        offset = 0
+        now = time.time()
+        for client, sent, request_states, _ in batch:
+            count = len(request_states)
+            responses[client].put((pis[offset:offset + count],
+                                   vs[offset:offset + count]))
+            metrics.latencies.append(now - sent)
+            offset += count
+        metrics.batch_sizes.append(size)
+
+
+def gather_batch(requests, max_batch, max_latency, poll=0.05):
+    """Takes the next dynamic batch of requests from the request queue.
+
+    The batch is closed when it holds max_batch positions or when the
+    oldest request was sent max_latency seconds ago. Time spent queued
+    counts, so requests waiting behind a slow batch are not delayed again;
+    requests already queued are still taken after the deadline.
+
+    Args:
+        requests: A queue of (client, sent time, states, players) tuples.
+        max_batch: The number of positions which closes the batch.
+        max_latency: The longest wait in seconds from the oldest request.
+        poll: How long to wait in seconds for the first request.
+
+    Returns:
+        A list of requests, empty if none came in, and their number of
+        positions.
+    """
+    try:
+        batch = [requests.get(timeout=poll)]
+    except queue.Empty:
+        return [], 0
+
+    size = len(batch[0][2])
+    deadline = batch[0][1] + max_latency
+    while size < max_batch:
+        remaining = deadline - time.time()
+        try:
+            if remaining > 0:
+                request = requests.get(timeout=remaining)
+            else:
+                request = requests.get_nowait()
+        except queue.Empty:
+            break
+        batch.append(request)
+        size += len(request[2])
+
+    return batch, size
+
+
+class ServerMetrics(object):
+    """Keeps recent queue depth, batch size and latency samples.
+
+    Attributes:
+        queue_depths: A deque of request queue depths after each batch.
+        batch_sizes: A deque of the number of positions per batch.
+        latencies: A deque of request round trip times in seconds.
+    """
+
+    def __init__(self, max_samples=10000):
+        """Initializes ServerMetrics with empty sample windows."""
+        self.queue_depths = collections.deque(maxlen=max_samples)
+        self.batch_sizes = collections.deque(maxlen=max_samples)
+        self.latencies = collections.deque(maxlen=max_samples)
+
+    def summary(self, cache=None):
+        """Summarizes the recent samples.
+
+        Args:
+            cache: The evaluation cache of the served network, or None.
+
+        Returns:
+            A dictionary of metric names and values.
+        """
+        latencies = np.array(self.latencies) * 1000
+        summary = {
+            "batches": len(self.batch_sizes),
+            "mean_batch_size": float(np.mean(self.batch_sizes))
+            if self.batch_sizes else 0.0,
+            "max_queue_depth": max(self.queue_depths)
+            if self.queue_depths else 0,
+            "mean_latency_ms": float(latencies.mean())
+            if len(latencies) else 0.0,
+            "p95_latency_ms": float(np.percentile(latencies, 95))
+            if len(latencies) else 0.0,
+        }
+        if cache is not None:
+            summary["cache_hits"] = cache.hits
+            summary["cache_misses"] = cache.misses
+
+        return summary
+
+
+class RemoteNetwork(object):
+    """A client of the inference server with the predict API of the network.
+
+    Attributes:
+        client: An integer for the index of the client.
+        requests: The server's request queue.
+        responses: The response queue of this client.
+        stopped: The event the server sets when it exits.
+        cache: Always None, the server holds the evaluation cache.
+    """
+
+    def __init__(self, client, requests, responses, stopped):
+        """Initializes RemoteNetwork with its queues."""
+        self.client = client
+        self.requests = requests
+        self.responses = responses
+        self.stopped = stopped
+        self.cache = None
+
+    def predict(self, state, current_player=None):
+        """Predicts move probabilities and state values given a game state.
+
+        Args:
+            state: A list containing the game state in matrix form.
+            current_player: The player to move, part of the cache key.
+
+        Returns:
+            A probability vector and a value scalar
+        """
+        pi, v = self.predict_batch(state[np.newaxis, :, :], [current_player])
+
+        return pi[0], v[0]
+
+    def predict_batch(self, states, current_players=None):
+        """Sends states to the server and waits for the evaluations.
+
+        Args:
+            states: An array of game states with shape (N, row, column).
+            current_players: An optional list of the players to move.
+
+        Returns:
+            An (N, action_size) array of probability vectors and an (N,)
+            array of values.
+
+        Raises:
+            RuntimeError: The server stopped or did not answer within
+                CFG.inference_timeout_s seconds.
+        """
+        states = np.asarray(states, dtype=np.float32)
+        if current_players is None:
+            current_players = [None] * len(states)
+        sent = time.time()
+        self.requests.put((self.client, sent, states, list(current_players)))
+
+        deadline = sent + CFG.inference_timeout_s
+        while True:
+            remaining = deadline - time.time()
+            try:
+                return self.responses.get(timeout=min(max(remaining, 0), 1))
+            except queue.Empty:
+                if self.stopped.is_set():
+                    raise RuntimeError("The inference server has stopped.")
+                if time.time() >= deadline:
+                    raise RuntimeError(
+                        "No answer from the inference server in %g s."
+                        % CFG.inference_timeout_s)
+
+
+class InferenceServer(object):
+    """Starts and controls an inference server process.
+
+    Attributes:
+        num_clients: An integer for the number of clients.
+        clients: A list of RemoteNetwork objects to hand to the workers.
+        stopped: An event set by the server process when it exits.
+        process: The server process.
+    """
+
+    def __init__(self, num_clients):
+        """Initializes InferenceServer and the queues of its clients."""
+        import multiprocessing
+
+        # TensorFlow is not fork safe, so the server starts a fresh
+        # interpreter.
+        self.context = multiprocessing.get_context("spawn")
+        self.num_clients = num_clients
+        self.requests = self.context.Queue()
+        self.responses = [self.context.Queue() for _ in range(num_clients)]
+        self.control = self.context.Queue()
+        self.replies = self.context.Queue()
+        self.stopped = self.context.Event()
+        self.clients = [RemoteNetwork(client, self.requests,
+                                      self.responses[client], self.stopped)
+                        for client in range(num_clients)]
+        self.process = None
+
+    def start(self, model_path=None):
+        """Starts the server process with the weights of a checkpoint.
+
+        Args:
+            model_path: The checkpoint path of the network to serve.
+        """
+        config = {name: value for name, value in vars(CFG).items()
+                  if not name.startswith("__")}
+        self.process = self.context.Process(
+            target=serve, args=(config, model_path, self.requests,
+                                self.responses, self.control, self.replies,
+                                self.stopped),
+            daemon=True)
+        self.process.start()
+
+    def load_model(self, model_path):
+        """Loads new weights into the server without restarting clients.
+
+        Args:
+            model_path: The checkpoint path of the new weights.
+        """
+        self.control.put(("load", model_path))
+        self.wait_for_reply()
+
+    def stats(self):
+        """Returns the queue depth, batch size and latency metrics."""
+        self.control.put(("stats",))
+        return self.wait_for_reply()
+
+    def is_alive(self):
+        """Returns whether the server process is running."""
+        return self.process is not None and self.process.is_alive()
+
+    def wait_for_reply(self):
+        """Waits for the answer to a control message.
+
+        Returns:
+            The answer of the server.
+
+        Raises:
+            RuntimeError: The server process exited before answering.
+        """
+        while True:
+            try:
+                return self.replies.get(timeout=1)
+            except queue.Empty:
+                if not self.is_alive():
+                    raise RuntimeError("The inference server exited.")
+
+    def stop(self):
+        """Stops the server process.
+
+        Returns:
+            The final metrics of the server.
+        """
+        self.control.put(("stop",))
+        metrics = self.wait_for_reply()
+        self.process.join()
+        return metrics
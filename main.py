@@ -1,14 +1,12 @@
 """Run and play"""
+import time
+
+start_time = time.perf_counter()
+
 import argparse
 import os
 
 from othello.othello_game import OthelloGame
-from neural_net import NeuralNetworkWrapper
-from train import Train
-from evaluate import Evaluate
-from mcts import MonteCarloTreeSearch, TreeNode
-from human_play import HumanPlay
-from AI_play import AIplayer
 from config import CFG
 
 # Code to read command line arguments
@@ -170,6 +168,196 @@ parser.add_argument("--game",
                     type=int,
                     default=CFG.game)
 
+parser.add_argument("--bitboard",
+                    help="Binary to use the bitboard backend for Othello.",
+                    dest="bitboard",
+                    type=int,
+                    default=CFG.bitboard)
+
+parser.add_argument("--tt_size",
+                    help="Number of positions in the transposition table.",
+                    dest="tt_size",
+                    type=int,
+                    default=CFG.tt_size)
+
+parser.add_argument("--endgame_empties",
+                    help="Empty squares at which MCTS plays the solved move.",
+                    dest="endgame_empties",
+                    type=int,
+                    default=CFG.endgame_empties)
+
+parser.add_argument("--mcts_batch_size",
+                    help="Number of leaves evaluated together in one MCTS round.",
+                    dest="mcts_batch_size",
+                    type=int,
+                    default=CFG.mcts_batch_size)
+
+parser.add_argument("--mcts_workers",
+                    help="Number of threads searching in parallel per move.",
+                    dest="mcts_workers",
+                    type=int,
+                    default=CFG.mcts_workers)
+
+parser.add_argument("--mcts_parallel",
+                    help="Parallel search mode.",
+                    dest="mcts_parallel",
+                    type=str,
+                    choices=["tree", "root"],
+                    default=CFG.mcts_parallel)
+
+parser.add_argument("--eval_cache_mb",
+                    help="Memory cap in MB of the network evaluation cache.",
+                    dest="eval_cache_mb",
+                    type=float,
+                    default=CFG.eval_cache_mb)
+
+parser.add_argument("--selfplay_workers",
+                    help="Number of processes playing self-play games.",
+                    dest="selfplay_workers",
+                    type=int,
+                    default=CFG.selfplay_workers)
+
+parser.add_argument("--pin_cores",
+                    help="Binary to pin each self-play worker to one core.",
+                    dest="pin_cores",
+                    type=int,
+                    default=CFG.pin_cores)
+
+parser.add_argument("--inference_server",
+                    help="Binary to evaluate for all workers in one server.",
+                    dest="inference_server",
+                    type=int,
+                    default=CFG.inference_server)
+
+parser.add_argument("--inference_max_batch",
+                    help="Largest batch the inference server evaluates.",
+                    dest="inference_max_batch",
+                    type=int,
+                    default=CFG.inference_max_batch)
+
+parser.add_argument("--inference_max_latency_ms",
+                    help="Longest wait in ms for a server batch to fill up.",
+                    dest="inference_max_latency_ms",
+                    type=float,
+                    default=CFG.inference_max_latency_ms)
+
+parser.add_argument("--inference_timeout_s",
+                    help="Longest wait in s for an inference server answer.",
+                    dest="inference_timeout_s",
+                    type=float,
+                    default=CFG.inference_timeout_s)
+
+parser.add_argument("--frozen_inference",
+                    help="Binary to play with a folded inference only graph.",
+                    dest="frozen_inference",
+                    type=int,
+                    default=CFG.frozen_inference)
+
+parser.add_argument("--inference_precision",
+                    help="float32, or float16 / int8 for a quantized model.",
+                    dest="inference_precision",
+                    choices=["float32", "float16", "int8"],
+                    default=CFG.inference_precision)
+
+parser.add_argument("--calibration_states",
+                    help="Number of self-play positions kept for calibration.",
+                    dest="calibration_states",
+                    type=int,
+                    default=CFG.calibration_states)
+
+parser.add_argument("--startup_time",
+                    help="Binary to time startup up to the first AI move "
+                         "of the chosen mode and exit.",
+                    dest="startup_time",
+                    type=int,
+                    default=CFG.startup_time)
+
+parser.add_argument("--replay_iterations",
+                    help="Number of iterations of positions kept for training.",
+                    dest="replay_iterations",
+                    type=int,
+                    default=CFG.replay_iterations)
+
+parser.add_argument("--replay_sample",
+                    help="Positions sampled per iteration, 0 for all.",
+                    dest="replay_sample",
+                    type=int,
+                    default=CFG.replay_sample)
+
+parser.add_argument("--batch_symmetries",
+                    help="Binary to randomly rotate and flip training batches.",
+                    dest="batch_symmetries",
+                    type=int,
+                    default=CFG.batch_symmetries)
+
+parser.add_argument("--async_training",
+                    help="Binary to run self-play, training and gating "
+                         "concurrently.",
+                    dest="async_training",
+                    type=int,
+                    default=CFG.async_training)
+
+parser.add_argument("--sprt_gating",
+                    help="Binary to gate with parallel games and SPRT.",
+                    dest="sprt_gating",
+                    type=int,
+                    default=CFG.sprt_gating)
+
+parser.add_argument("--eval_workers",
+                    help="Number of evaluation games played at once.",
+                    dest="eval_workers",
+                    type=int,
+                    default=CFG.eval_workers)
+
+parser.add_argument("--sprt_max_games",
+                    help="Most evaluation games played when gating.",
+                    dest="sprt_max_games",
+                    type=int,
+                    default=CFG.sprt_max_games)
+
+parser.add_argument("--sprt_margin",
+                    help="Distance of the SPRT hypotheses from eval_win_rate.",
+                    dest="sprt_margin",
+                    type=float,
+                    default=CFG.sprt_margin)
+
+parser.add_argument("--sprt_alpha",
+                    help="Probability of accepting a network that is not "
+                         "better.",
+                    dest="sprt_alpha",
+                    type=float,
+                    default=CFG.sprt_alpha)
+
+parser.add_argument("--sprt_beta",
+                    help="Probability of rejecting a network that is better.",
+                    dest="sprt_beta",
+                    type=float,
+                    default=CFG.sprt_beta)
+
+parser.add_argument("--opening_plies",
+                    help="Moves of the balanced evaluation openings.",
+                    dest="opening_plies",
+                    type=int,
+                    default=CFG.opening_plies)
+
+parser.add_argument("--skip_duplicate_games",
+                    help="Binary to skip games repeating an earlier game.",
+                    dest="skip_duplicate_games",
+                    type=int,
+                    default=CFG.skip_duplicate_games)
+
+parser.add_argument("--record_games",
+                    help="Binary to write self-play games to record files.",
+                    dest="record_games",
+                    type=int,
+                    default=CFG.record_games)
+
+parser.add_argument("--import_records",
+                    help="Glob pattern of game records to train on.",
+                    dest="import_records",
+                    type=str,
+                    default=CFG.import_records)
+
 if __name__ == '__main__':
     """Initializes game state, neural network and the training loop"""
     arguments = parser.parse_args()
@@ -201,35 +389,102 @@ if __name__ == '__main__':
     CFG.record_loss = arguments.record_loss
     CFG.loss_file = arguments.loss_file
     CFG.game = arguments.game
+    CFG.bitboard = arguments.bitboard
+    CFG.tt_size = arguments.tt_size
+    CFG.endgame_empties = arguments.endgame_empties
+    CFG.mcts_batch_size = arguments.mcts_batch_size
+    CFG.mcts_workers = arguments.mcts_workers
+    CFG.mcts_parallel = arguments.mcts_parallel
+    CFG.eval_cache_mb = arguments.eval_cache_mb
+    CFG.selfplay_workers = arguments.selfplay_workers
+    CFG.pin_cores = arguments.pin_cores
+    CFG.inference_server = arguments.inference_server
+    CFG.inference_max_batch = arguments.inference_max_batch
+    CFG.inference_max_latency_ms = arguments.inference_max_latency_ms
+    CFG.inference_timeout_s = arguments.inference_timeout_s
+    CFG.frozen_inference = arguments.frozen_inference
+    CFG.inference_precision = arguments.inference_precision
+    CFG.calibration_states = arguments.calibration_states
+    CFG.startup_time = arguments.startup_time
+    CFG.replay_iterations = arguments.replay_iterations
+    CFG.replay_sample = arguments.replay_sample
+    CFG.batch_symmetries = arguments.batch_symmetries
+    CFG.async_training = arguments.async_training
+    CFG.sprt_gating = arguments.sprt_gating
+    CFG.eval_workers = arguments.eval_workers
+    CFG.sprt_max_games = arguments.sprt_max_games
+    CFG.sprt_margin = arguments.sprt_margin
+    CFG.sprt_alpha = arguments.sprt_alpha
+    CFG.sprt_beta = arguments.sprt_beta
+    CFG.opening_plies = arguments.opening_plies
+    CFG.skip_duplicate_games = arguments.skip_duplicate_games
+    CFG.record_games = arguments.record_games
+    CFG.import_records = arguments.import_records
     
     # Initialize the game object with the chosen game.
     game = object
     if CFG.game == 1:
         game = OthelloGame()
     
+    # TensorFlow is imported here, after the arguments are parsed, and only
+    # the networks of the chosen mode are built.
+    from neural_net import NeuralNetworkWrapper
+
     net_pk1 = NeuralNetworkWrapper(game)
-    net_pk2 = NeuralNetworkWrapper(game)
+    net_pk2 = None
+    if CFG.AI_play and not CFG.human_play:
+        net_pk2 = NeuralNetworkWrapper(game)
     
     if CFG.load_model:
         file_path1 = CFG.model_directory + "best_model.meta"
         if os.path.exists(file_path1):
             net_pk1.load_model("best_model")
         file_path2 = CFG.model_directory2 + "best_model.meta"
-        if os.path.exists(file_path2):
+        if net_pk2 is not None and os.path.exists(file_path2):
             net_pk2.load_model("best_model")
     else:
         print("Trained model not loaded. Starting from scratch.")  
-        
+
+    if CFG.human_play or CFG.AI_play:
+        net_pk1.prepare_inference()
+        if net_pk2 is not None:
+            net_pk2.prepare_inference()
+
+    if CFG.startup_time:
+        from mcts import MonteCarloTreeSearch, TreeNode
+
+        ready_time = time.perf_counter()
+        game.print_board()
+        board_time = time.perf_counter()
+        MonteCarloTreeSearch(net_pk1).search(game.clone(), TreeNode(),
+                                             CFG.temp_final)
+        move_time = time.perf_counter()
+
+        print("Networks ready: %.2fs" % (ready_time - start_time))
+        print("First board:    %.2fs" % (board_time - start_time))
+        print("First AI move:  %.2fs" % (move_time - start_time))
     # Play vs the AI as a human instead of training.
-    if CFG.human_play:
+    elif CFG.human_play:
+        from human_play import HumanPlay
+
         human_play = HumanPlay(game, net_pk1)
         human_play.play()
     # Game between AI 
     elif CFG.AI_play:
+        from AI_play import AIplayer
+
         AI_player = AIplayer(net_pk1, net_pk2, game)
         AI_player.play()
+    # Train the models with the actor, learner and gatekeeper processes.
+    elif CFG.async_training:
+        from async_train import AsyncTrain
+
+        train = AsyncTrain(game, net_pk1)
+        train.start()
     #train the models
     else:
+        from train import Train
+
         train = Train(game, net_pk1)
         train.start()
         
@@ -1,97 +1,409 @@
 """Classes for Monte Carlo Tree Search."""
 import math
+import threading
+from collections import OrderedDict
+
 import numpy as np
 
 from config import CFG
-from copy import deepcopy
+from othello.endgame import EndgameSolver
 
+# Value taken off Qsa for every pending evaluation below a node.
+VIRTUAL_LOSS = 1.0
 
-class TreeNode(object):
-    """Represents a board state and stores statistics for actions at that state.
+
+class TranspositionTable(object):
+    """A bounded table of the expanded nodes of a tree keyed by position.
+
+    A node reaching a position stored in the table shares the children of
+    the stored node, so the edge statistics of transposed positions are
+    accumulated once. The least recently used entry is evicted when the
+    table is full.
 
     Attributes:
-        Nsa: An integer for visit count.
-        Wsa: A float for the total action value.
-        Qsa: A float for the mean action value.
-        Psa: A float for the prior probability of reaching this node.
-        action: A tuple(row, column) of the prior move of reaching this node.
-        children: A list which stores child nodes.
-        child_psas: A vector containing child probabilities.
-        parent: A TreeNode representing the parent node.
+        size: An integer for the maximum number of entries.
+        entries: An OrderedDict mapping (position hash, player to move) keys
+            to (node index, network value) tuples.
+        hits: An integer counting lookups which found an entry.
+        misses: An integer counting lookups which found no entry.
     """
 
-    def __init__(self, parent=None, action=None, psa=0.0, child_psas=[]):
-        """Initializes TreeNode with the initial statistics and data."""
-        self.Nsa = 0
-        self.Wsa = 0.0
-        self.Qsa = 0.0
-        self.Psa = psa
-        self.action = action
-        self.children = []
-        self.child_psas = child_psas
-        self.parent = parent
+    def __init__(self, size):
+        """Initializes TranspositionTable with an empty table."""
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
 
-    def is_not_leaf(self):
-        """Checks if a TreeNode is a leaf.
+    def get(self, key):
+        """Looks up the node stored for a position.
+
+        Args:
+            key: A (position hash, player to move) tuple.
 
         Returns:
-            A boolean value indicating if a TreeNode is a leaf.
+            A (node index, network value) tuple, or None if the position is
+            not stored.
         """
-        if len(self.children) > 0:
-            return True
-        return False
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
 
-    def select_child(self):
-        """Selects a child node based on the AlphaZero PUCT formula.
+    def put(self, key, index, v):
+        """Stores an expanded node, evicting the oldest entry if full.
 
-        Returns:
-            A child TreeNode which is the most promising according to PUCT.
+        Args:
+            key: A (position hash, player to move) tuple.
+            index: The index of the expanded node.
+            v: The network value of the position.
+        """
+        if self.size <= 0:
+            return
+        self.entries[key] = (index, v)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+class SearchTree(object):
+    """Stores the statistics of a whole search tree in preallocated arrays.
+
+    Node i is described by entry i of every array. The children of a node
+    are stored in one contiguous block, so expanding a node and walking its
+    children allocates no Python objects. The arrays double in size when
+    they are full.
+
+    Nodes reaching the same position share one block of children through
+    the transposition table, so the tree is a graph whose parent indexes
+    only record the first path. Statistics are backed up along the path a
+    simulation took.
+
+    Attributes:
+        size: An integer for the number of nodes in use.
+        action_size: An integer for the length of child probability vectors.
+        Nsa: An int array of visit counts.
+        Wsa: A float array of total action values.
+        Qsa: A float array of mean action values.
+        Psa: A float array of prior probabilities of reaching each node.
+        parent: An int array of parent indexes, -1 for a root.
+        first_child: An int array with the index of the first child.
+        num_children: An int array with the number of children.
+        action: An int array of the square index of the prior move.
+        flipped: A uint64 array of the flip set of the prior move, 0 if
+            unknown.
+        table: A TranspositionTable of the expanded nodes.
+    """
+
+    def __init__(self, capacity=1024):
+        """Initializes SearchTree with a single root node."""
+        self.size = 1
+        self.table = TranspositionTable(CFG.tt_size)
+        self.action_size = 0
+        self.Nsa = np.zeros(capacity, dtype=np.int32)
+        self.Wsa = np.zeros(capacity, dtype=np.float64)
+        self.Qsa = np.zeros(capacity, dtype=np.float64)
+        self.Psa = np.zeros(capacity, dtype=np.float64)
+        self.parent = np.full(capacity, -1, dtype=np.int32)
+        self.first_child = np.zeros(capacity, dtype=np.int32)
+        self.num_children = np.zeros(capacity, dtype=np.int32)
+        self.action = np.full(capacity, -1, dtype=np.int32)
+        self.flipped = np.zeros(capacity, dtype=np.uint64)
+
+    def reserve(self, count):
+        """Grows the arrays so that count more nodes fit.
+
+        Args:
+            count: The number of nodes about to be added.
         """
-        c_puct = CFG.c_puct
+        capacity = len(self.Nsa)
+        if self.size + count <= capacity:
+            return
+        while self.size + count > capacity:
+            capacity *= 2
+        for name in ("Nsa", "Wsa", "Qsa", "Psa", "parent", "first_child",
+                     "num_children", "action", "flipped"):
+            old = getattr(self, name)
+            grown = np.zeros(capacity, dtype=old.dtype)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+
+    def expand(self, index, game, psa_vector):
+        """Expands a node by adding a child for every legal move.
 
-        highest_uct = 0
-        highest_index = 0
+        Args:
+            index: The index of the node to expand.
+            game: An object containing the game state at the node.
+            psa_vector: A vector containing move probabilities for each move.
+        """
+        legal_mask, flip_sets = game.get_legal_moves(game.current_player)
+        self.expand_moves(index, legal_mask, flip_sets, psa_vector)
+
+    def expand_moves(self, index, legal_mask, flip_sets, psa_vector):
+        """Expands a node from a legal move mask computed beforehand.
+
+        Args:
+            index: The index of the node to expand.
+            legal_mask: A legal move mask from get_legal_moves.
+            flip_sets: The flip sets from get_legal_moves, or None.
+            psa_vector: A vector containing move probabilities for each move.
+        """
+        self.action_size = len(legal_mask)
+        moves = np.flatnonzero(legal_mask)
+        count = len(moves)
+
+        self.reserve(count)
+        block = slice(self.size, self.size + count)
+        self.Nsa[block] = 0
+        self.Wsa[block] = 0.0
+        self.Qsa[block] = 0.0
+        self.Psa[block] = psa_vector[moves]
+        self.parent[block] = index
+        self.num_children[block] = 0
+        self.action[block] = moves
+        if flip_sets is None:
+            self.flipped[block] = 0
+        else:
+            self.flipped[block] = [flip_sets[move] for move in moves]
+
+        self.first_child[index] = self.size
+        self.num_children[index] = count
+        self.size += count
+
+    def select_child(self, index):
+        """Selects a child based on the AlphaZero PUCT formula.
+
+        The children are scored in one pass over the arrays as Python
+        lists, which is faster than NumPy at Othello's branching factors.
+
+        Args:
+            index: The index of the parent node.
+
+        Returns:
+            The index of the most promising child according to PUCT.
+        """
+        first = int(self.first_child[index])
+        last = first + int(self.num_children[index])
+        exploration = CFG.c_puct * math.sqrt(self.Nsa[index])
 
         # Select the child with the highest Q + U value
-        for idx, child in enumerate(self.children):
-            uct = child.Qsa + child.Psa * c_puct * (
-                    math.sqrt(self.Nsa) / (1 + child.Nsa))
+        highest_uct = -math.inf
+        highest_index = first
+        for child, (qsa, psa, nsa) in enumerate(
+                zip(self.Qsa[first:last].tolist(),
+                    self.Psa[first:last].tolist(),
+                    self.Nsa[first:last].tolist()), first):
+            uct = qsa + psa * exploration / (1 + nsa)
             if uct > highest_uct:
                 highest_uct = uct
-                highest_index = idx
+                highest_index = child
 
-        return self.children[highest_index]
+        return highest_index
 
-    def expand_node(self, game, psa_vector):
-        """Expands the current node by adding valid moves as children.
+    def transpose(self, index, key):
+        """Shares the children of a stored node reaching the same position.
 
         Args:
-            game: An object containing the game state.
-            psa_vector: A list containing move probabilities for each move.
+            index: The index of the leaf to expand.
+            key: The (position hash, player to move) key of its position.
+
+        Returns:
+            The network value stored for the position, or None if no
+            expanded node reaches it.
         """
-        self.child_psas = deepcopy(psa_vector)
-        valid_moves = game.get_valid_moves(game.current_player)
-        for idx, move in enumerate(valid_moves):
-            if move[0] is not 0:
-                action = deepcopy(move)
-                self.add_child_node(parent=self, action=action,
-                                    psa=psa_vector[idx])
+        entry = self.table.get(key)
+        if entry is None:
+            return None
+        other, v = entry
+        self.first_child[index] = self.first_child[other]
+        self.num_children[index] = self.num_children[other]
+        return v
 
-    def add_child_node(self, parent, action, psa=0.0):
-        """Creates and adds a child TreeNode to the current node.
+    def store(self, index, key, v):
+        """Records an expanded node in the transposition table.
 
         Args:
-            parent: A TreeNode which is the parent of this node.
-            action: A tuple(row, column) of the prior move to reach this node.
-            psa: A float representing the raw move probability for this node.
+            index: The index of the expanded node.
+            key: The (position hash, player to move) key of its position.
+            v: The network value of the position.
+        """
+        if self.num_children[index] > 0:
+            self.table.put(key, index, v)
+
+    def back_prop(self, index, wsa, v):
+        """Update a node's statistics based on the game outcome.
+
+        Args:
+            index: The index of the node.
+            wsa: A float representing the action value for this state.
+            v: A float representing the network value of this state.
+        """
+        self.Nsa[index] += 1
+        self.Wsa[index] = wsa + v
+        self.Qsa[index] = self.Wsa[index] / self.Nsa[index]
+
+    def children(self, index):
+        """Returns the indexes of the children of a node.
+
+        Args:
+            index: The index of the parent node.
 
         Returns:
-            The newly created child TreeNode.
+            A range of child indexes.
         """
+        first = int(self.first_child[index])
+        return range(first, first + int(self.num_children[index]))
+
+    def child_psas(self, index):
+        """Rebuilds the child probability vector of a node from its children.
 
-        child_node = TreeNode(parent=parent, action=action, psa=psa)
-        self.children.append(child_node)
-        return child_node
+        Args:
+            index: The index of the parent node.
+
+        Returns:
+            A vector of length action_size with the children's priors.
+        """
+        psa_vector = np.zeros(self.action_size)
+        children = self.children(index)
+        psa_vector[self.action[children.start:children.stop]] = \
+            self.Psa[children.start:children.stop]
+        return psa_vector
+
+    def child_visits(self, index):
+        """Rebuilds the search policy of a node from its children's visits.
+
+        Args:
+            index: The index of the parent node.
+
+        Returns:
+            A vector of length action_size with the children's share of the
+            visits, or their priors if no child has been visited.
+        """
+        children = self.children(index)
+        visits = self.Nsa[children.start:children.stop].astype(np.float64)
+        total = visits.sum()
+        if total == 0:
+            return self.child_psas(index)
+
+        pi_vector = np.zeros(self.action_size)
+        pi_vector[self.action[children.start:children.stop]] = visits / total
+        return pi_vector
+
+
+class TreeNode(object):
+    """A handle on one node of a SearchTree.
+
+    Handles are only created for the nodes returned to callers, the search
+    itself works on node indexes. Creating a TreeNode without a tree starts
+    a new tree with this node as its root.
+
+    Attributes:
+        tree: The SearchTree holding the node.
+        index: The index of the node in the tree.
+    """
+
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree=None, index=0):
+        """Initializes TreeNode with its tree and index."""
+        if tree is None:
+            tree = SearchTree()
+        self.tree = tree
+        self.index = index
+
+    @property
+    def Nsa(self):
+        """An integer for visit count."""
+        return int(self.tree.Nsa[self.index])
+
+    @property
+    def Wsa(self):
+        """A float for the total action value."""
+        return float(self.tree.Wsa[self.index])
+
+    @property
+    def Qsa(self):
+        """A float for the mean action value."""
+        return float(self.tree.Qsa[self.index])
+
+    @property
+    def Psa(self):
+        """A float for the prior probability of reaching this node."""
+        return float(self.tree.Psa[self.index])
+
+    @property
+    def action(self):
+        """An integer square index of the prior move to reach this node."""
+        return int(self.tree.action[self.index])
+
+    @property
+    def flipped(self):
+        """The flip set of the prior move, or None if it is not known."""
+        flipped = int(self.tree.flipped[self.index])
+        return flipped if flipped else None
+
+    @property
+    def parent(self):
+        """A TreeNode representing the parent node, None for the root."""
+        parent = self.tree.parent[self.index]
+        if parent < 0:
+            return None
+        return TreeNode(self.tree, int(parent))
+
+    @parent.setter
+    def parent(self, parent):
+        """Detaches the node from its parent, making it a root.
+
+        Args:
+            parent: Must be None, nodes cannot be re-attached.
+        """
+        if parent is not None:
+            raise ValueError("A TreeNode can only be detached from its parent.")
+        self.tree.parent[self.index] = -1
+
+    @property
+    def children(self):
+        """A list of TreeNodes for the children of this node."""
+        return [TreeNode(self.tree, child)
+                for child in self.tree.children(self.index)]
+
+    @property
+    def child_psas(self):
+        """A vector containing child probabilities."""
+        return self.tree.child_psas(self.index)
+
+    @property
+    def child_visits(self):
+        """A vector containing the children's share of the visits."""
+        return self.tree.child_visits(self.index)
+
+    def is_not_leaf(self):
+        """Checks if a TreeNode is a leaf.
+
+        Returns:
+            A boolean value indicating if a TreeNode is a leaf.
+        """
+        return self.tree.num_children[self.index] > 0
+
+    def select_child(self):
+        """Selects a child node based on the AlphaZero PUCT formula.
+
+        Returns:
+            A child TreeNode which is the most promising according to PUCT.
+        """
+        return TreeNode(self.tree, self.tree.select_child(self.index))
+
+    def expand_node(self, game, psa_vector):
+        """Expands the current node by adding valid moves as children.
+
+        Args:
+            game: An object containing the game state.
+            psa_vector: A vector containing move probabilities for each move.
+        """
+        self.tree.expand(self.index, game, psa_vector)
 
     def back_prop(self, wsa, v):
         """Update the current node's statistics based on the game outcome.
@@ -100,9 +412,7 @@ class TreeNode(object):
             wsa: A float representing the action value for this state.
             v: A float representing the network value of this state.
         """
-        self.Nsa += 1
-        self.Wsa = wsa + v
-        self.Qsa = self.Wsa / self.Nsa
+        self.tree.back_prop(self.index, wsa, v)
 
 
 class MonteCarloTreeSearch(object):
@@ -112,6 +422,7 @@ class MonteCarloTreeSearch(object):
         root: A TreeNode representing the board state and its statistics.
         game: An object containing the game state.
         net: An object containing the neural network.
+        solver: An EndgameSolver used when few empty squares are left.
     """
 
     def __init__(self, net):
@@ -119,6 +430,7 @@ class MonteCarloTreeSearch(object):
         self.root = None
         self.game = None
         self.net = net
+        self.solver = EndgameSolver()
 
     def search(self, game, node, temperature):
         """MCTS loop to get the best move which can be played at a given state.
@@ -134,57 +446,381 @@ class MonteCarloTreeSearch(object):
         self.root = node
         self.game = game
 
-        for i in range(CFG.num_mcts_sims):
-            node = self.root
-            game = self.game.clone()  # Create a fresh clone for each loop.
+        # Play the exact move when the endgame is small enough to solve,
+        # and fall back to the search if the solved move is not usable.
+        if CFG.endgame_empties > 0:
+            solved = game.solve_endgame(CFG.endgame_empties, self.solver)
+            if solved is not None:
+                child = self.solved_child(solved[0])
+                if child is not None:
+                    return child
+
+        tree = node.tree
+        root = node.index
+
+        if CFG.mcts_workers > 1 and CFG.mcts_parallel == "root":
+            self.run_root_parallel_simulations(tree, root)
+        elif CFG.mcts_workers > 1:
+            self.run_tree_parallel_simulations(tree, root)
+        elif CFG.mcts_batch_size > 1:
+            self.run_batched_simulations(tree, root)
+        else:
+            self.run_simulations(tree, root, self.game, CFG.num_mcts_sims)
+
+        children = tree.children(root)
+        highest_nsa = 0
+        highest_index = children.start
+
+        # Select the child's move using a temperature parameter.
+        for idx, nsa in zip(children, tree.Nsa[children.start:
+                                                children.stop].tolist()):
+            temperature_exponent = int(1 / temperature)
+
+            if nsa ** temperature_exponent > highest_nsa:
+                highest_nsa = nsa ** temperature_exponent
+                highest_index = idx
+
+        return TreeNode(tree, highest_index)
+
+    def run_simulations(self, tree, root, game, num_sims):
+        """Runs the simulations one at a time with one network call each.
+
+        Args:
+            tree: The SearchTree holding the root.
+            root: The index of the root node.
+            game: An object containing the game state at the root. It is
+                walked down and back up, so it ends unchanged.
+            num_sims: The number of simulations to run.
+        """
+        for i in range(num_sims):
+            node = root
+            path = [root]
 
             # Loop when node is not a leaf
-            while node.is_not_leaf():
-                node = node.select_child()
-                game.play_action(node.action)
+            while tree.num_children[node] > 0:
+                node = tree.select_child(node)
+                flipped = int(tree.flipped[node])
+                game.play_action(int(tree.action[node]), flipped or None)
+                path.append(node)
 
-            # Get move probabilities and values from the network for this state.
-            psa_vector, v = self.net.predict(game.state)
+            game_over, wsa = game.check_game_over(game.current_player)
 
-            # Add Dirichlet noise to the psa_vector of the root node.
-            if node.parent is None:
-                psa_vector = self.add_dirichlet_noise(game, psa_vector)
+            # Share the children of a transposed position, or get move
+            # probabilities and values from the network for this state.
+            key = (game.hash, game.current_player)
+            v = tree.transpose(node, key)
+            if v is None:
+                psa_vector, v = self.net.predict(game.state,
+                                                 game.current_player)
 
-            valid_moves = game.get_valid_moves(game.current_player)
-            for idx, move in enumerate(valid_moves):
-                if move[0] is 0:
-                    psa_vector[idx] = 0
+                legal_mask, flip_sets = game.get_legal_moves(
+                    game.current_player)
+                psa_vector = self.prepare_priors(game, psa_vector,
+                                                 legal_mask, node == root)
 
-            psa_vector_sum = sum(psa_vector)
+                # Try expanding the current node.
+                tree.expand_moves(node, legal_mask, flip_sets, psa_vector)
+                tree.store(node, key, v)
 
-            # Renormalize psa vector
-            if psa_vector_sum > 0:
-                psa_vector /= psa_vector_sum
+            self.back_up(tree, path, wsa, v)
 
-            # Try expanding the current node.
-            node.expand_node(game=game, psa_vector=psa_vector)
+            # Take back the moves played during selection.
+            for _ in range(len(path) - 1):
+                game.undo_action()
 
-            game_over, wsa = game.check_game_over(game.current_player)
+    def run_batched_simulations(self, tree, root):
+        """Runs the simulations in rounds of CFG.mcts_batch_size leaves.
 
-            # Back propagate node statistics up to the root node.
-            while node is not None:
-                wsa = -wsa
-                v = -v
-                node.back_prop(wsa, v)
-                node = node.parent
+        Each leaf selected in a round puts a virtual loss on its path, so
+        the next selection is steered to other leaves. All leaves of a round
+        are evaluated with one network call, then the virtual losses are
+        removed and the real values are backed up.
 
-        highest_nsa = 0
-        highest_index = 0
+        Args:
+            tree: The SearchTree holding the root.
+            root: The index of the root node.
+        """
+        game = self.game
+        sims = 0
+
+        while sims < CFG.num_mcts_sims:
+            batch_size = min(CFG.mcts_batch_size, CFG.num_mcts_sims - sims)
+            leaves = []
+            states = []
+            players = []
+
+            while len(leaves) < batch_size:
+                node = root
+                path = [root]
+
+                while tree.num_children[node] > 0:
+                    node = tree.select_child(node)
+                    flipped = int(tree.flipped[node])
+                    game.play_action(int(tree.action[node]), flipped or None)
+                    path.append(node)
+
+                # Stop the round when selection returns to a pending leaf.
+                if any(leaf[0] == node for leaf in leaves):
+                    for _ in range(len(path) - 1):
+                        game.undo_action()
+                    break
+
+                game_over, wsa = game.check_game_over(game.current_player)
+                key = (game.hash, game.current_player)
+                v = tree.transpose(node, key)
+                if v is not None:
+                    # A transposition is backed up at once without a
+                    # network call.
+                    self.back_up(tree, path, wsa, v)
+                    sims += 1
+                    for _ in range(len(path) - 1):
+                        game.undo_action()
+                    if sims + len(leaves) >= CFG.num_mcts_sims:
+                        break
+                    continue
+
+                legal_mask, flip_sets = game.get_legal_moves(
+                    game.current_player)
+                states.append(game.state.copy())
+                players.append(game.current_player)
+
+                leaves.append((node, path, legal_mask, flip_sets, wsa, key))
+
+                tree.Nsa[path] += 1
+                tree.Qsa[path] -= VIRTUAL_LOSS
+
+                for _ in range(len(path) - 1):
+                    game.undo_action()
+
+            if not leaves:
+                continue
+
+            # Evaluate all leaves of the round with one network call.
+            pis, vs = self.net.predict_batch(
+                np.array(states, dtype=np.float32), players)
+
+            for leaf in leaves:
+                tree.Nsa[leaf[1]] -= 1
+                tree.Qsa[leaf[1]] += VIRTUAL_LOSS
+
+            for (node, path, legal_mask, flip_sets, wsa, key), psa_vector, \
+                    v in zip(leaves, pis, vs):
+                psa_vector = self.prepare_priors(game, psa_vector, legal_mask,
+                                                 node == root)
+                tree.expand_moves(node, legal_mask, flip_sets, psa_vector)
+                tree.store(node, key, v)
+                self.back_up(tree, path, wsa, v)
+
+            sims += len(leaves)
+
+    def run_tree_parallel_simulations(self, tree, root):
+        """Runs the simulations on CFG.mcts_workers threads sharing one tree.
+
+        Selection, expansion and backup hold the tree lock. Network calls
+        run outside it, so TensorFlow evaluates several leaves at once.
+        Virtual loss keeps the threads on different paths. Each thread
+        plays on its own clone of the game.
 
-        # Select the child's move using a temperature parameter.
-        for idx, child in enumerate(self.root.children):
-            temperature_exponent = int(1 / temperature)
+        Args:
+            tree: The SearchTree holding the root.
+            root: The index of the root node.
+        """
+        lock = threading.Lock()
+        started = [0]
+
+        def worker(game, index):
+            while True:
+                with lock:
+                    if started[0] >= CFG.num_mcts_sims:
+                        return
+                    started[0] += 1
+
+                    node = root
+                    path = [root]
+                    while tree.num_children[node] > 0:
+                        node = tree.select_child(node)
+                        flipped = int(tree.flipped[node])
+                        game.play_action(int(tree.action[node]),
+                                         flipped or None)
+                        path.append(node)
+
+                    game_over, wsa = game.check_game_over(
+                        game.current_player)
+                    key = (game.hash, game.current_player)
+                    v = tree.transpose(node, key)
+                    if v is not None:
+                        self.back_up(tree, path, wsa, v)
+                    else:
+                        tree.Nsa[path] += 1
+                        tree.Qsa[path] -= VIRTUAL_LOSS
+
+                if v is not None:
+                    for _ in range(len(path) - 1):
+                        game.undo_action()
+                    continue
+
+                legal_mask, flip_sets = game.get_legal_moves(
+                    game.current_player)
+
+                psa_vector, v = self.net.predict(game.state,
+                                                 game.current_player)
+                psa_vector = self.prepare_priors(game, psa_vector, legal_mask,
+                                                 node == root)
+
+                with lock:
+                    tree.Nsa[path] -= 1
+                    tree.Qsa[path] += VIRTUAL_LOSS
+
+                    # Another thread may have expanded the leaf meanwhile.
+                    if tree.num_children[node] == 0:
+                        tree.expand_moves(node, legal_mask, flip_sets,
+                                          psa_vector)
+                        tree.store(node, key, v)
+                    self.back_up(tree, path, wsa, v)
+
+                for _ in range(len(path) - 1):
+                    game.undo_action()
+
+        self.run_workers(worker)
+
+    def run_root_parallel_simulations(self, tree, root):
+        """Runs independent searches on CFG.mcts_workers threads and merges.
+
+        Every thread searches its own tree from the root position with its
+        own Dirichlet noise. The visit counts and values of the root
+        children are then summed into the shared tree.
 
-            if child.Nsa ** temperature_exponent > highest_nsa:
-                highest_nsa = child.Nsa ** temperature_exponent
-                highest_index = idx
+        Args:
+            tree: The SearchTree holding the root.
+            root: The index of the root node.
+        """
+        worker_trees = [SearchTree() for _ in range(CFG.mcts_workers)]
+        shares = [CFG.num_mcts_sims // CFG.mcts_workers +
+                  (i < CFG.num_mcts_sims % CFG.mcts_workers)
+                  for i in range(CFG.mcts_workers)]
+
+        def worker(game, index):
+            self.run_simulations(worker_trees[index], 0, game, shares[index])
+
+        self.run_workers(worker)
+
+        if tree.num_children[root] == 0:
+            tree.expand(root, self.game, worker_trees[0].child_psas(0))
+
+        children = tree.children(root)
+        moves = tree.action[children.start:children.stop]
+        visits = tree.Nsa[children.start:children.stop].astype(np.float64)
+        values = tree.Qsa[children.start:children.stop] * visits
+
+        for worker_tree in worker_trees:
+            worker_children = worker_tree.children(0)
+            block = slice(worker_children.start, worker_children.stop)
+            order = np.searchsorted(moves, worker_tree.action[block])
+            np.add.at(visits, order, worker_tree.Nsa[block])
+            np.add.at(values, order,
+                      worker_tree.Qsa[block] * worker_tree.Nsa[block])
+            tree.Nsa[root] += worker_tree.Nsa[0]
+            tree.table.hits += worker_tree.table.hits
+            tree.table.misses += worker_tree.table.misses
+
+        tree.Nsa[children.start:children.stop] = visits
+        tree.Qsa[children.start:children.stop] = np.divide(
+            values, visits, out=np.zeros_like(values), where=visits > 0)
+        tree.Wsa[children.start:children.stop] = values
+
+    def run_workers(self, worker):
+        """Runs a worker function on CFG.mcts_workers threads.
+
+        Args:
+            worker: A function taking a private clone of the game and the
+                index of the worker.
+        """
+        threads = [threading.Thread(target=worker,
+                                    args=(self.game.clone(), index))
+                   for index in range(CFG.mcts_workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def prepare_priors(self, game, psa_vector, legal_mask, is_root):
+        """Turns network probabilities into the priors of a node's children.
+
+        Args:
+            game: An object containing the game state.
+            psa_vector: A probability vector from the network.
+            legal_mask: A legal move mask from get_legal_moves.
+            is_root: A bool, Dirichlet noise is added at the root.
+
+        Returns:
+            A probability vector which is 0 on illegal moves.
+        """
+        psa_vector = np.array(psa_vector)
+
+        # Add Dirichlet noise to the psa_vector of the root node.
+        if is_root:
+            psa_vector = self.add_dirichlet_noise(game, psa_vector)
+
+        psa_vector[legal_mask == 0] = 0
 
-        return self.root.children[highest_index]
+        psa_vector_sum = psa_vector.sum()
+
+        # Renormalize psa vector
+        if psa_vector_sum > 0:
+            psa_vector /= psa_vector_sum
+
+        return psa_vector
+
+    @staticmethod
+    def back_up(tree, path, wsa, v):
+        """Back propagates node statistics from a leaf up to the root.
+
+        Args:
+            tree: The SearchTree holding the nodes.
+            path: The node indexes from the root to the leaf.
+            wsa: The game result from the view of the player at the leaf.
+            v: The network value of the leaf.
+        """
+        v = float(v)
+        for node in reversed(path):
+            wsa = -wsa
+            v = -v
+            tree.back_prop(node, wsa, v)
+
+    def solved_child(self, action):
+        """Returns the root child of a solved move.
+
+        The root priors become one-hot on the solved move and the visits of
+        the root children are cleared, so self-play records the solved move
+        as the training target.
+
+        Args:
+            action: The square index of the solved move.
+
+        Returns:
+            The child TreeNode playing the solved move, or None if the move
+            is not legal at the root, in which case the tree is unchanged.
+        """
+        legal_mask, _ = self.game.get_legal_moves(self.game.current_player)
+        if not legal_mask[action]:
+            return None
+
+        psa_vector = np.zeros(self.game.action_size)
+        psa_vector[action] = 1
+
+        tree = self.root.tree
+        if not self.root.is_not_leaf():
+            tree.expand(self.root.index, self.game, psa_vector)
+
+        children = tree.children(self.root.index)
+        tree.Psa[children.start:children.stop] = \
+            psa_vector[tree.action[children.start:children.stop]]
+        tree.Nsa[children.start:children.stop] = 0
+
+        for child in children:
+            if tree.action[child] == action:
+                return TreeNode(tree, child)
+        return None
 
     def add_dirichlet_noise(self, game, psa_vector):
         """Add Dirichlet noise to the psa_vector of the root node.
@@ -198,13 +834,8 @@ class MonteCarloTreeSearch(object):
         Returns:
             A probability vector which has Dirichlet noise added to it.
         """
-        dirichlet_input = [CFG.dirichlet_alpha for x in range(game.action_size)]
+        dirichlet_input = np.full(game.action_size, CFG.dirichlet_alpha)
 
         dirichlet_list = np.random.dirichlet(dirichlet_input)
-        noisy_psa_vector = []
-
-        for idx, psa in enumerate(psa_vector):
-            noisy_psa_vector.append(
-                (1 - CFG.epsilon) * psa + CFG.epsilon * dirichlet_list[idx])
 
-        return noisy_psa_vector
+        return (1 - CFG.epsilon) * psa_vector + CFG.epsilon * dirichlet_list
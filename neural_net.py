@@ -1,5 +1,10 @@
 """Class to represent the Neural Network."""
 import os
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
 
 import tensorflow.compat.v1 as tf
 tf.disable_v2_behavior()
@@ -17,10 +22,19 @@ class NeuralNetwork(object):
         action_size: An integer indicating the total number of board squares.
         pi: A TF tensor for the search probabilities.
         v: A TF tensor for the search values.
-        states: A TF tensor with the dimensions of the board.
+        states: A TF tensor with the dimensions of the board, fed for
+            prediction and read from the input pipeline when training.
         training: A TF boolean scalar tensor.
         train_pis: A TF tensor for the target search probabilities.
         train_vs: A TF tensor for the target search values.
+        dataset_states: A TF placeholder for the training states.
+        dataset_pis: A TF placeholder for the training probabilities.
+        dataset_vs: A TF placeholder for the training values.
+        shuffle_size: A TF placeholder for the shuffle buffer size.
+        num_epochs: A TF placeholder for the number of passes over the data.
+        augment: A TF placeholder to apply random board symmetries to the
+            training batches.
+        iterator: A TF iterator over shuffled and prefetched batches.
         loss_pi: A TF tensor for the output of softmax cross entropy on pi.
         loss_v: A TF tensor for the output of mean squared error on v.
         total_loss: A TF tensor to store the addition of pi and v losses.
@@ -39,8 +53,31 @@ class NeuralNetwork(object):
 
         self.graph = tf.Graph()
         with self.graph.as_default():
-            self.states = tf.placeholder(tf.float32,
-                                         shape=[None, self.row, self.column])
+            # Input Pipeline
+            self.dataset_states = tf.placeholder(
+                tf.float32, shape=[None, self.row, self.column])
+            self.dataset_pis = tf.placeholder(tf.float32,
+                                              shape=[None, self.action_size])
+            self.dataset_vs = tf.placeholder(tf.float32, shape=[None])
+            self.shuffle_size = tf.placeholder(tf.int64, shape=[])
+            self.num_epochs = tf.placeholder(tf.int64, shape=[])
+            self.augment = tf.placeholder_with_default(False, shape=[])
+
+            dataset = tf.data.Dataset.from_tensor_slices(
+                (self.dataset_states, self.dataset_pis, self.dataset_vs))
+            dataset = dataset.shuffle(self.shuffle_size,
+                                      reshuffle_each_iteration=True)
+            dataset = dataset.batch(CFG.batch_size).repeat(self.num_epochs)
+            if (self.row == self.column and
+                    self.action_size == self.row * self.column):
+                dataset = dataset.map(self.augment_batch)
+            dataset = dataset.prefetch(tf.data.experimental.AUTOTUNE)
+            self.iterator = tf.data.make_initializable_iterator(dataset)
+            next_states, next_pis, next_vs = self.iterator.get_next()
+
+            # Prediction feeds the states, training reads the next batch.
+            self.states = tf.placeholder_with_default(
+                next_states, shape=[None, self.row, self.column])
             self.training = tf.placeholder(tf.bool)
 
             # Input Layer
@@ -146,9 +183,10 @@ class NeuralNetwork(object):
             self.v = tf.nn.tanh(dense2)
 
             # Loss Function
-            self.train_pis = tf.placeholder(tf.float32,
-                                            shape=[None, self.action_size])
-            self.train_vs = tf.placeholder(tf.float32, shape=[None])
+            self.train_pis = tf.placeholder_with_default(
+                next_pis, shape=[None, self.action_size])
+            self.train_vs = tf.placeholder_with_default(next_vs,
+                                                        shape=[None])
 
             self.loss_pi = tf.losses.softmax_cross_entropy(self.train_pis,
                                                            self.pi)
@@ -182,6 +220,333 @@ class NeuralNetwork(object):
             # Initialize the session.
             self.sess.run(tf.global_variables_initializer())
 
+    def augment_batch(self, states, pis, vs):
+        """Applies a random board symmetry to every example of a batch.
+
+        Args:
+            states: A TF tensor of a batch of states.
+            pis: A TF tensor of the batch's search probabilities.
+            vs: A TF tensor of the batch's game results.
+
+        Returns:
+            The transformed states and pis and the unchanged vs.
+        """
+        permutations = symmetry_permutations(self.row, self.column)
+
+        def transform(states, pis, augment):
+            if augment:
+                return random_symmetries(states, pis, permutations)
+            return states, pis
+
+        new_states, new_pis = tf.numpy_function(
+            transform, [states, pis, self.augment], [tf.float32, tf.float32])
+        new_states.set_shape(states.shape)
+        new_pis.set_shape(pis.shape)
+
+        return new_states, new_pis, vs
+
+
+def fold_batch_norm(kernel, bias, gamma, beta, mean, variance,
+                    epsilon=1e-3):
+    """Folds a batch normalization into the weights of the layer before it.
+
+    Args:
+        kernel: The kernel of the layer, output channels last.
+        bias: The bias of the layer.
+        gamma: The batch normalization scale.
+        beta: The batch normalization offset.
+        mean: The moving mean of the batch normalization.
+        variance: The moving variance of the batch normalization.
+        epsilon: The epsilon of the batch normalization.
+
+    Returns:
+        The folded kernel and bias.
+    """
+    scale = gamma / np.sqrt(variance + epsilon)
+
+    return kernel * scale, (bias - mean) * scale + beta
+
+
+def build_inference_graph(convs, denses, row, column):
+    """Builds an inference only graph from folded weights.
+
+    The graph holds the weights as constants and has no batch normalization,
+    loss, optimizer or saver ops.
+
+    Args:
+        convs: A list of folded (kernel, bias) pairs, the residual tower
+            first, then the policy and the value head convolution.
+        denses: A list of (kernel, bias) pairs, the policy logits first, then
+            the two value head layers.
+        row: An integer for the number of board rows.
+        column: An integer for the number of board columns.
+
+    Returns:
+        A GraphDef with a "states" input and "logits", "pi" and "v"
+        outputs.
+    """
+    def conv(inputs, weights):
+        outputs = tf.nn.conv2d(inputs, tf.constant(weights[0]),
+                               strides=[1, 1, 1, 1], padding="SAME")
+        return tf.nn.bias_add(outputs, tf.constant(weights[1]))
+
+    def dense(inputs, weights):
+        return tf.nn.bias_add(tf.matmul(inputs, tf.constant(weights[0])),
+                              tf.constant(weights[1]))
+
+    graph = tf.Graph()
+    with graph.as_default():
+        states = tf.placeholder(tf.float32, shape=[None, row, column],
+                                name="states")
+        outputs = tf.nn.relu(conv(tf.reshape(states, [-1, row, column, 1]),
+                                  convs[0]))
+
+        for i in range(1, len(convs) - 2, 2):
+            block = tf.nn.relu(conv(outputs, convs[i]))
+            outputs = tf.nn.relu(conv(block, convs[i + 1]) + outputs)
+
+        policy = tf.nn.relu(conv(outputs, convs[-2]))
+        policy = tf.reshape(policy, [-1, row * column * 2])
+        logits = tf.identity(dense(policy, denses[0]), name="logits")
+        tf.nn.softmax(logits, name="pi")
+
+        value = tf.nn.relu(conv(outputs, convs[-1]))
+        value = tf.nn.relu(dense(tf.reshape(value, [-1, row * column]),
+                                 denses[1]))
+        tf.reshape(tf.nn.tanh(dense(value, denses[2])), [-1], name="v")
+
+    return graph.as_graph_def()
+
+
+def save_calibration_states(training_data, max_states=None):
+    """Stores self-play positions for calibrating quantized networks.
+
+    Args:
+        training_data: A list of (state, pi, v) examples from self-play.
+        max_states: The number of positions to keep, by default
+            CFG.calibration_states.
+    """
+    if max_states is None:
+        max_states = CFG.calibration_states
+    if not training_data or max_states <= 0:
+        return
+
+    indices = np.random.choice(len(training_data),
+                               min(max_states, len(training_data)),
+                               replace=False)
+    states = np.array([training_data[i][0] for i in indices],
+                      dtype=np.float32)
+
+    # Create directory if it doesn't exist.
+    if not os.path.exists(CFG.model_directory):
+        os.mkdir(CFG.model_directory)
+
+    np.save(CFG.model_directory + "calibration_states.npy", states)
+
+
+def load_calibration_states():
+    """Loads the stored self-play positions.
+
+    Returns:
+        A float32 array of game states, or None if none were stored.
+    """
+    file_path = CFG.model_directory + "calibration_states.npy"
+    if not os.path.exists(file_path):
+        return None
+
+    return np.load(file_path)
+
+
+def canonicalize(state):
+    """Finds the canonical orientation of a board among its 8 symmetries.
+
+    Args:
+        state: A square board in matrix form.
+
+    Returns:
+        The board in canonical orientation and the index of the symmetry
+        which maps the board to it.
+    """
+    best_state = None
+    best_key = None
+    best_symmetry = 0
+    for symmetry in range(8):
+        candidate = np.rot90(state, symmetry % 4)
+        if symmetry >= 4:
+            candidate = np.fliplr(candidate)
+        key = candidate.tobytes()
+        if best_key is None or key < best_key:
+            best_state = candidate
+            best_key = key
+            best_symmetry = symmetry
+    return best_state, best_symmetry
+
+
+def restore_policy(psa_vector, symmetry, row, column):
+    """Maps a policy of a canonical board back to the original orientation.
+
+    Args:
+        psa_vector: A probability vector for the canonical board.
+        symmetry: The index of the symmetry returned by canonicalize.
+        row: An integer indicating the length of the board row.
+        column: An integer indicating the length of the board column.
+
+    Returns:
+        A probability vector for the original board.
+    """
+    psa_matrix = np.reshape(psa_vector, (row, column))
+    if symmetry >= 4:
+        psa_matrix = np.fliplr(psa_matrix)
+    return np.rot90(psa_matrix, -(symmetry % 4)).flatten()
+
+
+def symmetry_permutations(row, column):
+    """Lists the square permutations of the 8 symmetries of a square board.
+
+    Args:
+        row: An integer indicating the length of the board row.
+        column: An integer indicating the length of the board column.
+
+    Returns:
+        An (8, row * column) array, row i holds for every square of the
+        transformed board the square of the original board, in the symmetry
+        order of canonicalize.
+    """
+    squares = np.arange(row * column).reshape(row, column)
+    permutations = []
+    for symmetry in range(8):
+        candidate = np.rot90(squares, symmetry % 4)
+        if symmetry >= 4:
+            candidate = np.fliplr(candidate)
+        permutations.append(candidate.flatten())
+    return np.array(permutations)
+
+
+def random_symmetries(states, pis, permutations):
+    """Transforms every state and its policy by its own random symmetry.
+
+    Args:
+        states: An (N, row, column) array of game states.
+        pis: An (N, row * column) array of search probabilities.
+        permutations: The array returned by symmetry_permutations.
+
+    Returns:
+        The transformed states and pis.
+    """
+    gather = permutations[np.random.randint(len(permutations),
+                                            size=len(states))]
+    flat_states = np.take_along_axis(states.reshape(len(states), -1),
+                                     gather, axis=1)
+
+    return (flat_states.reshape(states.shape),
+            np.take_along_axis(pis, gather, axis=1))
+
+
+def cache_entry_overhead():
+    """Measures the bytes one evaluation cache entry takes besides its data.
+
+    The data is the policy vector and the canonical board bytes. The rest
+    is measured with sys.getsizeof: the key and entry tuples, the bytes and
+    array headers, the value scalar, the entry's share of a filled
+    OrderedDict table, and the OrderedDict's linked list node of four
+    pointers.
+
+    Returns:
+        An integer number of bytes.
+    """
+    psa_vector = np.zeros(64, dtype=np.float32)
+    key = (bytes(64), 1)
+    entry = (psa_vector, np.float32(0))
+    objects = (sys.getsizeof(key) + sys.getsizeof(key[0]) - len(key[0]) +
+               sys.getsizeof(entry) + sys.getsizeof(entry[1]) +
+               sys.getsizeof(psa_vector) - psa_vector.nbytes)
+
+    count = 4096
+    table = OrderedDict((index, None) for index in range(count))
+    table_share = sys.getsizeof(table) / count
+    node = 4 * struct.calcsize("P")
+
+    return int(np.ceil(objects + table_share + node))
+
+
+class EvaluationCache(object):
+    """An LRU cache of network evaluations with a memory cap.
+
+    Entries are keyed by the canonical orientation of a board and the player
+    to move, so all 8 symmetric positions share one entry.
+
+    Attributes:
+        max_bytes: An integer for the approximate memory cap of the entries.
+        entries: An OrderedDict mapping keys to (psa_vector, v) tuples.
+        num_bytes: An integer for the approximate memory used by the entries.
+        hits: An integer counting lookups which found an entry.
+        misses: An integer counting lookups which found no entry.
+        lock: A lock so that parallel searches can share the cache.
+    """
+
+    # Per-entry overhead of the dict, tuples and object headers.
+    ENTRY_OVERHEAD = cache_entry_overhead()
+
+    def __init__(self, max_bytes):
+        """Initializes EvaluationCache with an empty cache."""
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Looks up the evaluation stored for a canonical position.
+
+        Args:
+            key: A tuple of the canonical board bytes and the player to move.
+
+        Returns:
+            A (psa_vector, v) tuple, or None if the position is not stored.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, psa_vector, v):
+        """Stores an evaluation, evicting the least recently used if full.
+
+        Args:
+            key: A tuple of the canonical board bytes and the player to move.
+            psa_vector: A probability vector for the canonical board.
+            v: A float value.
+        """
+        size = psa_vector.nbytes + len(key[0]) + self.ENTRY_OVERHEAD
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = (psa_vector, v)
+            self.num_bytes += size
+            while self.num_bytes > self.max_bytes and self.entries:
+                old_key, (old_psa_vector, _) = self.entries.popitem(
+                    last=False)
+                self.num_bytes -= (old_psa_vector.nbytes + len(old_key[0]) +
+                                   self.ENTRY_OVERHEAD)
+
+    def clear(self):
+        """Removes all entries and resets the hit and miss counters."""
+        with self.lock:
+            self.entries.clear()
+            self.num_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def hit_rate(self):
+        """Returns the fraction of lookups which found an entry."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
 
 class NeuralNetworkWrapper(object):
     """Wrapper class for the NeuralNetwork class.
@@ -190,6 +555,12 @@ class NeuralNetworkWrapper(object):
         game: An object containing the game state.
         net: An object containing the neural network.
         sess: A TF session for running Ops on the Graph.
+        cache: An EvaluationCache in front of the network, or None.
+        frozen: A (session, states, pi, v) tuple of a loaded inference only
+            graph, or None to evaluate with the training graph.
+        quantized: A (interpreter, lock, states, logits, v) tuple of a
+            loaded reduced precision TFLite model, or None.
+        save_thread: The thread writing a background checkpoint, or None.
     """
 
     def __init__(self, game):
@@ -197,23 +568,337 @@ class NeuralNetworkWrapper(object):
         self.game = game
         self.net = NeuralNetwork(self.game)
         self.sess = self.net.sess
-
-    def predict(self, state):
+        self.cache = None
+        self.frozen = None
+        self.quantized = None
+        self.save_thread = None
+        if CFG.eval_cache_mb > 0:
+            self.cache = EvaluationCache(int(CFG.eval_cache_mb * 1024 * 1024))
+
+    def predict(self, state, current_player=None):
         """Predicts move probabilities and state values given a game state.
 
         Args:
             state: A list containing the game state in matrix form.
+            current_player: The player to move, part of the cache key.
 
         Returns:
             A probability vector and a value scalar
         """
-        state = state[np.newaxis, :, :]
+        pi, v = self.predict_batch(state[np.newaxis, :, :],
+                                   [current_player])
+
+        return pi[0], v[0]
+
+    def predict_batch(self, states, current_players=None):
+        """Predicts move probabilities and state values for many game states.
+
+        The states are cast to float32 once; a float32 array is fed to the
+        session without being copied. With the evaluation cache enabled,
+        only positions missing from the cache are sent to the network, in
+        their canonical orientation.
+
+        Args:
+            states: An array of game states with shape (N, row, column).
+            current_players: An optional list of the players to move, part
+                of the cache key.
+
+        Returns:
+            An (N, action_size) array of probability vectors and an (N,)
+            array of values.
+        """
+        states = np.asarray(states, dtype=np.float32)
+        if states.ndim != 3 or states.shape[1:] != (self.net.row,
+                                                    self.net.column):
+            raise ValueError("Expected states of shape (N, %d, %d), got %s."
+                             % (self.net.row, self.net.column, states.shape))
+
+        if self.cache is None:
+            return self.run_network(states)
+
+        if current_players is None:
+            current_players = [None] * len(states)
+
+        pis = np.empty((len(states), self.net.action_size), dtype=np.float32)
+        vs = np.empty(len(states), dtype=np.float32)
+        misses = []
+        for idx, (state, player) in enumerate(zip(states, current_players)):
+            canonical_state, symmetry = canonicalize(state.astype(np.int8))
+            key = (canonical_state.tobytes(), player)
+            entry = self.cache.get(key)
+            if entry is None:
+                misses.append((idx, key, canonical_state, symmetry))
+            else:
+                pis[idx] = restore_policy(entry[0], symmetry, self.net.row,
+                                          self.net.column)
+                vs[idx] = entry[1]
+
+        if misses:
+            miss_pis, miss_vs = self.run_network(
+                np.array([miss[2] for miss in misses], dtype=np.float32))
+            for (idx, key, _, symmetry), pi, v in zip(misses, miss_pis,
+                                                      miss_vs):
+                # A copy, a row view would keep the whole batch alive.
+                self.cache.put(key, pi.copy(), v)
+                pis[idx] = restore_policy(pi, symmetry, self.net.row,
+                                          self.net.column)
+                vs[idx] = v
+
+        return pis, vs
+
+    def run_network(self, states):
+        """Runs the network on a float32 batch of states.
+
+        Args:
+            states: A float32 array of game states with shape (N, row,
+                column).
+
+        Returns:
+            An (N, action_size) array of probability vectors and an (N,)
+            array of values.
+        """
+        if self.quantized is not None:
+            interpreter, lock, states_index, logits_index, v_index = \
+                self.quantized
+            # The interpreter keeps its tensors between calls, so searches
+            # running on several threads take turns.
+            with lock:
+                if interpreter.get_input_details()[0]["shape"][0] != \
+                        len(states):
+                    interpreter.resize_tensor_input(states_index,
+                                                    states.shape)
+                    interpreter.allocate_tensors()
+                interpreter.set_tensor(states_index, states)
+                interpreter.invoke()
+                logits = interpreter.get_tensor(logits_index)
+                v = interpreter.get_tensor(v_index).copy()
+
+            # The softmax stays in float32, an int8 softmax output is too
+            # coarse to rank moves with close probabilities.
+            pi = np.exp(logits - logits.max(axis=1, keepdims=True))
+            return pi / pi.sum(axis=1, keepdims=True), v
+
+        if self.frozen is not None:
+            sess, states_tensor, pi_tensor, v_tensor = self.frozen
+            return sess.run([pi_tensor, v_tensor],
+                            feed_dict={states_tensor: states})
 
         pi, v = self.sess.run([self.net.pi, self.net.v],
-                              feed_dict={self.net.states: state,
+                              feed_dict={self.net.states: states,
                                          self.net.training: False})
 
-        return pi[0], v[0][0]
+        return pi, v[:, 0]
+
+    def freeze_graph(self):
+        """Folds batch normalization into the current weights.
+
+        Returns:
+            A GraphDef of the inference only network.
+        """
+        with self.net.graph.as_default():
+            variables = {variable.op.name: variable
+                         for variable in tf.global_variables()}
+        values = self.sess.run(variables)
+
+        def layer(name, i):
+            return name if i == 0 else "%s_%d" % (name, i)
+
+        convs = []
+        for i in range(2 * CFG.resnet_blocks + 3):
+            conv = layer("conv2d", i)
+            norm = layer("batch_normalization", i)
+            convs.append(fold_batch_norm(values[conv + "/kernel"],
+                                         values[conv + "/bias"],
+                                         values[norm + "/gamma"],
+                                         values[norm + "/beta"],
+                                         values[norm + "/moving_mean"],
+                                         values[norm + "/moving_variance"]))
+
+        denses = [(values[layer("dense", i) + "/kernel"],
+                   values[layer("dense", i) + "/bias"]) for i in range(3)]
+
+        return build_inference_graph(convs, denses, self.game.row,
+                                     self.game.column)
+
+    def freeze(self, graph_def=None):
+        """Evaluates with an inference only graph until the weights change.
+
+        Args:
+            graph_def: The GraphDef to load, by default the current weights
+                folded with freeze_graph.
+        """
+        if graph_def is None:
+            graph_def = self.freeze_graph()
+        self.unfreeze()
+
+        graph = tf.Graph()
+        with graph.as_default():
+            tf.import_graph_def(graph_def, name="")
+        self.frozen = (tf.Session(graph=graph),
+                       graph.get_tensor_by_name("states:0"),
+                       graph.get_tensor_by_name("pi:0"),
+                       graph.get_tensor_by_name("v:0"))
+        self.clear_cache()
+
+    def unfreeze(self):
+        """Goes back to evaluating with the training graph."""
+        if self.frozen is not None:
+            self.frozen[0].close()
+            self.frozen = None
+            self.clear_cache()
+        if self.quantized is not None:
+            self.quantized = None
+            self.clear_cache()
+
+    def quantized_model(self, calibration_states=None, precision=None):
+        """Converts the folded network to a reduced precision TFLite model.
+
+        Args:
+            calibration_states: Game states used to calibrate the int8
+                activation ranges, by default the stored self-play positions.
+            precision: "int8" or "float16", by default
+                CFG.inference_precision.
+
+        Returns:
+            The serialized TFLite model.
+        """
+        if precision is None:
+            precision = CFG.inference_precision
+        if precision not in ("int8", "float16"):
+            raise ValueError("Unknown inference precision: %s" % precision)
+
+        graph = tf.Graph()
+        with graph.as_default():
+            tf.import_graph_def(self.freeze_graph(), name="")
+        with tf.Session(graph=graph) as sess:
+            converter = tf.lite.TFLiteConverter.from_session(
+                sess, [graph.get_tensor_by_name("states:0")],
+                [graph.get_tensor_by_name("logits:0"),
+                 graph.get_tensor_by_name("v:0")])
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+            if precision == "float16":
+                converter.target_spec.supported_types = [tf.float16]
+            else:
+                if calibration_states is None:
+                    calibration_states = load_calibration_states()
+                if calibration_states is None:
+                    print("No stored self-play positions, calibrating on "
+                          "the initial position.")
+                    calibration_states = [self.game.state]
+                calibration_states = np.asarray(calibration_states,
+                                                dtype=np.float32)
+                converter.representative_dataset = lambda: (
+                    [state[np.newaxis]] for state in calibration_states)
+
+            return converter.convert()
+
+    def quantize(self, calibration_states=None, precision=None,
+                 model_content=None):
+        """Evaluates with a reduced precision model until the weights change.
+
+        Args:
+            calibration_states: Game states used to calibrate the int8
+                activation ranges.
+            precision: "int8" or "float16", by default
+                CFG.inference_precision.
+            model_content: A serialized TFLite model to load instead of
+                converting the current weights.
+        """
+        if model_content is None:
+            model_content = self.quantized_model(calibration_states,
+                                                 precision)
+        self.unfreeze()
+
+        interpreter = tf.lite.Interpreter(model_content=model_content)
+        interpreter.allocate_tensors()
+        outputs = {detail["name"]: detail["index"]
+                   for detail in interpreter.get_output_details()}
+        self.quantized = (interpreter, threading.Lock(),
+                          interpreter.get_input_details()[0]["index"],
+                          outputs["logits"], outputs["v"])
+        self.clear_cache()
+
+    def export_quantized_model(self, filename="quantized_model.tflite",
+                               calibration_states=None):
+        """Writes a reduced precision TFLite model of the current weights.
+
+        Args:
+            filename: A string representing the model file name.
+            calibration_states: Game states used to calibrate the int8
+                activation ranges.
+        """
+        # Create directory if it doesn't exist.
+        if not os.path.exists(CFG.model_directory):
+            os.mkdir(CFG.model_directory)
+
+        print("Exporting", CFG.inference_precision, "model:", filename,
+              "at", CFG.model_directory)
+        with open(CFG.model_directory + filename, "wb") as model_file:
+            model_file.write(self.quantized_model(calibration_states))
+
+    def load_quantized_model(self, filename="quantized_model.tflite"):
+        """Loads a reduced precision TFLite model for play and self-play.
+
+        Args:
+            filename: A string representing the model file path.
+        """
+        print("Loading quantized model:", filename)
+        with open(filename, "rb") as model_file:
+            self.quantize(model_content=model_file.read())
+
+    def prepare_inference(self):
+        """Switches to the inference graph chosen by the configuration."""
+        if CFG.inference_precision != "float32":
+            self.quantize()
+        elif CFG.frozen_inference:
+            self.freeze()
+
+    def export_frozen_model(self, filename="frozen_model.pb"):
+        """Writes the inference only graph of the current weights.
+
+        Args:
+            filename: A string representing the graph file name.
+        """
+        # Create directory if it doesn't exist.
+        if not os.path.exists(CFG.model_directory):
+            os.mkdir(CFG.model_directory)
+
+        print("Exporting frozen model:", filename, "at", CFG.model_directory)
+        tf.io.write_graph(self.freeze_graph(), CFG.model_directory, filename,
+                          as_text=False)
+
+    def load_frozen_model(self, filename="frozen_model.pb"):
+        """Loads an inference only graph for play and self-play.
+
+        Args:
+            filename: A string representing the graph file path.
+        """
+        print("Loading frozen model:", filename)
+        graph_def = tf.GraphDef()
+        with open(filename, "rb") as graph_file:
+            graph_def.ParseFromString(graph_file.read())
+        self.freeze(graph_def)
+
+    def load_inference_model(self, file_path):
+        """Loads a checkpoint, or the inference model of the configuration.
+
+        Args:
+            file_path: The checkpoint path, the frozen graph and the
+                quantized model are expected at the same path with a ".pb"
+                and ".tflite" suffix.
+        """
+        if CFG.inference_precision != "float32":
+            self.load_quantized_model(file_path + ".tflite")
+        elif CFG.frozen_inference:
+            self.load_frozen_model(file_path + ".pb")
+        else:
+            self.load_model(file_path)
+
+    def clear_cache(self):
+        """Drops cached evaluations, needed whenever the weights change."""
+        if self.cache is not None:
+            self.cache.clear()
 
     def train(self, training_data):
         """Trains the network using states, pis and vs from self play games.
@@ -221,40 +906,71 @@ class NeuralNetworkWrapper(object):
         Args:
             training_data: A list containing states, pis and vs
         """
-        print("\nTraining the network.\n")
+        states = np.array([example[0] for example in training_data],
+                          dtype=np.float32)
+        pis = np.array([example[1] for example in training_data],
+                       dtype=np.float32)
+        vs = np.array([example[2] for example in training_data],
+                      dtype=np.float32)
 
-        for epoch in range(CFG.epochs):
-            print("Epoch", epoch + 1)
+        self.train_arrays(states, pis, vs)
 
-            examples_num = len(training_data)
+    def train_arrays(self, states, pis, vs):
+        """Trains the network on arrays of states, pis and vs.
 
-            # Divide epoch into batches.
-            for i in range(0, examples_num, CFG.batch_size):
-                states, pis, vs = map(list,
-                                      zip(*training_data[i:i + CFG.batch_size]))
+        The arrays are handed to the input pipeline once, which shuffles
+        them every epoch and prefetches the batches.
 
-                feed_dict = {self.net.states: states,
-                             self.net.train_pis: pis,
-                             self.net.train_vs: vs,
-                             self.net.training: True}
+        Args:
+            states: A float32 array of states with shape (N, row, column).
+            pis: A float32 array of search probabilities with shape
+                (N, action_size).
+            vs: A float32 array of game results with shape (N,).
+        """
+        print("\nTraining the network.\n")
+        self.wait_for_save()
+        self.unfreeze()
+        self.clear_cache()
+
+        examples_num = len(states)
+        if examples_num == 0:
+            return
+
+        self.sess.run(self.net.iterator.initializer,
+                      feed_dict={self.net.dataset_states: states,
+                                 self.net.dataset_pis: pis,
+                                 self.net.dataset_vs: vs,
+                                 self.net.shuffle_size: examples_num,
+                                 self.net.num_epochs: CFG.epochs,
+                                 self.net.augment: bool(
+                                     CFG.game == 1 and CFG.batch_symmetries)})
+
+        batches_num = -(-examples_num // CFG.batch_size)
+        fetches = [self.net.train_op, self.net.loss_pi, self.net.loss_v]
+        losses = []
 
-                self.sess.run(self.net.train_op,
-                              feed_dict=feed_dict)
+        for epoch in range(CFG.epochs):
+            start = time.time()
+            for _ in range(batches_num):
+                _, pi_loss, v_loss = self.sess.run(
+                    fetches, feed_dict={self.net.training: True})
+                losses.append((pi_loss, v_loss))
+            elapsed = time.time() - start
 
-                pi_loss, v_loss = self.sess.run(
-                    [self.net.loss_pi, self.net.loss_v],
-                    feed_dict=feed_dict)
+            print("Epoch %d: pi loss %.4f, v loss %.4f, %.0f examples/sec"
+                  % (epoch + 1, pi_loss, v_loss,
+                     examples_num / max(elapsed, 1e-9)))
 
-                # Record pi and v loss to a file.
-                if CFG.record_loss:
-                    # Create directory if it doesn't exist.
-                    if not os.path.exists(CFG.model_directory):
-                        os.mkdir(CFG.model_directory)
+        # Record pi and v loss to a file.
+        if CFG.record_loss:
+            # Create directory if it doesn't exist.
+            if not os.path.exists(CFG.model_directory):
+                os.mkdir(CFG.model_directory)
 
-                    file_path = CFG.model_directory + CFG.loss_file
+            file_path = CFG.model_directory + CFG.loss_file
 
-                    with open(file_path, 'a') as loss_file:
-                        loss_file.write('%f|%f\n' % (pi_loss, v_loss))
+            with open(file_path, 'a') as loss_file:
+                loss_file.writelines('%f|%f\n' % loss for loss in losses)
 
         print("\n")
 
@@ -282,4 +998,72 @@ class NeuralNetworkWrapper(object):
         file_path = filename
 
         print("Loading model:", filename)
+        self.wait_for_save()
         self.net.saver.restore(self.sess, file_path)
+        self.unfreeze()
+        self.clear_cache()
+
+    def save_checkpoint(self, file_path):
+        """Saves only the variables, without the meta graph, at a path.
+
+        The checkpoint can be read back with load_model.
+
+        Args:
+            file_path: A string representing the checkpoint path.
+        """
+        self.net.saver.save(self.sess, file_path, write_meta_graph=False)
+
+    def save_model_async(self, filename="current_model"):
+        """Saves the network model on a background thread.
+
+        Anything that changes the weights waits for the write to finish
+        first, so the checkpoint holds the weights at the time of the call.
+
+        Args:
+            filename: A string representing the model name.
+        """
+        self.wait_for_save()
+        self.save_thread = threading.Thread(target=self.save_model,
+                                            args=(filename,))
+        self.save_thread.start()
+
+    def wait_for_save(self):
+        """Blocks until the background checkpoint, if any, is written."""
+        if self.save_thread is not None:
+            self.save_thread.join()
+            self.save_thread = None
+
+    def snapshot(self):
+        """Copies all network and optimizer variables into memory.
+
+        Returns:
+            A dictionary of variable names and NumPy arrays.
+        """
+        with self.net.graph.as_default():
+            variables = {variable.op.name: variable
+                         for variable in tf.global_variables()}
+
+        return self.sess.run(variables)
+
+    def restore(self, snapshot):
+        """Assigns weights from a snapshot without touching the disk.
+
+        The snapshot may come from this or another NeuralNetworkWrapper of
+        the same game and configuration, so it both rolls back and copies
+        networks.
+
+        Args:
+            snapshot: A dictionary returned by snapshot.
+        """
+        self.wait_for_save()
+        with self.net.graph.as_default():
+            variables = tf.global_variables()
+
+        # Feeding the initial values of the initializers assigns every
+        # variable in one run without adding ops to the graph.
+        self.sess.run([variable.initializer for variable in variables],
+                      feed_dict={variable.initializer.inputs[1]:
+                                 snapshot[variable.op.name]
+                                 for variable in variables})
+        self.unfreeze()
+        self.clear_cache()
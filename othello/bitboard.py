@@ -0,0 +1,171 @@
+"""Bitboard move generation and flipping for Othello.
+
+A position is stored as two 64-bit integers, one per colour. Square
+(row, column) maps to bit row * 8 + column, which is also the index of the
+square in the action vector used by the network.
+"""
+
+FULL = 0xFFFFFFFFFFFFFFFF
+NOT_COLUMN_0 = 0xFEFEFEFEFEFEFEFE
+NOT_COLUMN_7 = 0x7F7F7F7F7F7F7F7F
+
+# (row step, column step, bit shift, wrap mask) for the 8 directions.
+DIRECTIONS = (
+    (-1, -1, -9, NOT_COLUMN_7),
+    (-1, 0, -8, FULL),
+    (-1, 1, -7, NOT_COLUMN_0),
+    (0, -1, -1, NOT_COLUMN_7),
+    (0, 1, 1, NOT_COLUMN_0),
+    (1, -1, 7, NOT_COLUMN_7),
+    (1, 0, 8, FULL),
+    (1, 1, 9, NOT_COLUMN_0),
+)
+
+SQUARE_MASKS = tuple(1 << i for i in range(64))
+
+
+def _rays(square):
+    """Lists the square masks along each direction from a square."""
+    rays = []
+    for row_step, column_step, _, _ in DIRECTIONS:
+        row = square // 8 + row_step
+        column = square % 8 + column_step
+        ray = []
+        while 0 <= row < 8 and 0 <= column < 8:
+            ray.append(SQUARE_MASKS[row * 8 + column])
+            row += row_step
+            column += column_step
+        if len(ray) >= 2:
+            rays.append(tuple(ray))
+    return tuple(rays)
+
+
+# The squares seen from every square in the directions where a move can
+# flip, that is with at least two squares before the edge.
+RAYS = tuple(_rays(square) for square in range(64))
+
+# (left shift, right shift, wrap mask) for the 8 directions, the shift of
+# the unused side being 0.
+FILL_SHIFTS = tuple((amount if amount > 0 else 0,
+                     -amount if amount < 0 else 0, mask)
+                    for _, _, amount, mask in DIRECTIONS)
+
+
+def shift(board, amount, mask):
+    """Shifts every disc of a bitboard one step in a direction.
+
+    Args:
+        board: A 64-bit integer bitboard.
+        amount: The bit shift of the direction, positive towards row 7.
+        mask: A mask clearing the discs which wrapped around a board edge.
+
+    Returns:
+        The shifted bitboard.
+    """
+    if amount > 0:
+        return (board << amount) & mask & FULL
+    return (board >> -amount) & mask
+
+
+def legal_moves(own, opp):
+    """Generates all legal moves for a player with shift-and-mask fills.
+
+    Args:
+        own: The bitboard of the player to move.
+        opp: The bitboard of the opponent.
+
+    Returns:
+        A bitboard with a bit set on every legal move.
+    """
+    empty = ~(own | opp) & FULL
+    moves = 0
+    # The shifts are written out, this is the hottest loop of the engine.
+    for left, right, mask in FILL_SHIFTS:
+        opp_mask = opp & mask
+        if left:
+            line = (own << left) & opp_mask
+            line |= (line << left) & opp_mask
+            line |= (line << left) & opp_mask
+            line |= (line << left) & opp_mask
+            line |= (line << left) & opp_mask
+            line |= (line << left) & opp_mask
+            moves |= (line << left) & mask
+        else:
+            line = (own >> right) & opp_mask
+            line |= (line >> right) & opp_mask
+            line |= (line >> right) & opp_mask
+            line |= (line >> right) & opp_mask
+            line |= (line >> right) & opp_mask
+            line |= (line >> right) & opp_mask
+            moves |= (line >> right) & mask
+    return moves & empty
+
+
+def flips(own, opp, square):
+    """Computes the discs flipped by playing on a square, in all directions.
+
+    Args:
+        own: The bitboard of the player to move.
+        opp: The bitboard of the opponent.
+        square: The index of the square played, row * 8 + column.
+
+    Returns:
+        A bitboard of the opponent discs which are flipped. It is empty when
+        the move is illegal.
+    """
+    flipped = 0
+    for ray in RAYS[square]:
+        line = 0
+        for cursor in ray:
+            if cursor & opp:
+                line |= cursor
+            else:
+                if cursor & own:
+                    flipped |= line
+                break
+    return flipped
+
+
+def popcount(board):
+    """Counts the discs on a bitboard.
+
+    Args:
+        board: A 64-bit integer bitboard.
+
+    Returns:
+        The number of set bits.
+    """
+    return bin(board).count("1")
+
+
+def squares(board):
+    """Iterates over the set squares of a bitboard.
+
+    Args:
+        board: A 64-bit integer bitboard.
+
+    Yields:
+        The index of every set bit, lowest first.
+    """
+    while board:
+        lowest = board & -board
+        yield lowest.bit_length() - 1
+        board ^= lowest
+
+
+def from_state(state, player):
+    """Builds the bitboard of a player from a board matrix.
+
+    Args:
+        state: An 8 x 8 matrix with 1, -1 and 0 entries.
+        player: The player whose discs are collected.
+
+    Returns:
+        A bitboard of the player's discs.
+    """
+    board = 0
+    for x in range(8):
+        for y in range(8):
+            if state[x][y] == player:
+                board |= SQUARE_MASKS[x * 8 + y]
+    return board
@@ -0,0 +1,135 @@
+"""Exact endgame solver for Othello positions on bitboards."""
+from othello import bitboard
+
+# Corners are searched first and the squares next to them last.
+_CORNERS = 0x8100000000000081
+_X_AND_C_SQUARES = 0x42C300000000C342
+
+
+class EndgameSolver(object):
+    """Solves positions exactly with negamax alpha-beta search.
+
+    The game ends as in OthelloGame.check_game_over: as soon as either
+    player has no legal move. The score is the disc difference for the
+    player to move at that point.
+
+    Attributes:
+        table_size: An integer for the maximum number of hash table entries.
+        table: A dictionary mapping (own, opp) to (lower, upper) score bounds.
+        nodes: An integer counting the positions searched.
+    """
+
+    def __init__(self, table_size=100000):
+        """Initializes EndgameSolver with an empty hash table."""
+        self.table_size = table_size
+        self.table = {}
+        self.nodes = 0
+
+    def solve(self, own, opp):
+        """Finds the best move and the exact score of a position.
+
+        Args:
+            own: The bitboard of the player to move.
+            opp: The bitboard of the opponent.
+
+        Returns:
+            A tuple (square, score). square is None if the position is
+            already over.
+        """
+        moves = bitboard.legal_moves(own, opp)
+        if not moves or not bitboard.legal_moves(opp, own):
+            return None, bitboard.popcount(own) - bitboard.popcount(opp)
+
+        alpha = -65
+        best_square = None
+        for square, flipped in self.order_moves(own, opp, moves):
+            move = bitboard.SQUARE_MASKS[square]
+            score = -self.negamax(opp ^ flipped, own | flipped | move,
+                                  -65, -alpha)
+            if score > alpha or best_square is None:
+                alpha = score
+                best_square = square
+        return best_square, alpha
+
+    def negamax(self, own, opp, alpha, beta):
+        """Searches a position with alpha-beta pruning.
+
+        Args:
+            own: The bitboard of the player to move.
+            opp: The bitboard of the opponent.
+            alpha: The lower bound of the search window.
+            beta: The upper bound of the search window.
+
+        Returns:
+            The score of the position for the player to move, exact when it
+            lies inside the window.
+        """
+        self.nodes += 1
+        moves = bitboard.legal_moves(own, opp)
+        if not moves or not bitboard.legal_moves(opp, own):
+            return bitboard.popcount(own) - bitboard.popcount(opp)
+
+        key = (own, opp)
+        bounds = self.table.get(key)
+        if bounds is not None:
+            lower, upper = bounds
+            if lower >= beta:
+                return lower
+            if upper <= alpha:
+                return upper
+            alpha = max(alpha, lower)
+            beta = min(beta, upper)
+
+        alpha_start = alpha
+        best = -65
+        for square, flipped in self.order_moves(own, opp, moves):
+            move = bitboard.SQUARE_MASKS[square]
+            score = -self.negamax(opp ^ flipped, own | flipped | move,
+                                  -beta, -alpha)
+            if score > best:
+                best = score
+                if best > alpha:
+                    alpha = best
+                    if alpha >= beta:
+                        break
+
+        if len(self.table) >= self.table_size:
+            self.table.clear()
+        if best <= alpha_start:
+            self.table[key] = (-65, best)
+        elif best >= beta:
+            self.table[key] = (best, 65)
+        else:
+            self.table[key] = (best, best)
+        return best
+
+    @staticmethod
+    def order_moves(own, opp, moves):
+        """Orders moves for the search, most promising first.
+
+        Corners come first and squares next to empty corners last. Within a
+        group, moves leaving the opponent the fewest replies come first.
+
+        Args:
+            own: The bitboard of the player to move.
+            opp: The bitboard of the opponent.
+            moves: A bitboard of the legal moves.
+
+        Returns:
+            A list of (square, flipped) tuples.
+        """
+        ordered = []
+        for square in bitboard.squares(moves):
+            move = bitboard.SQUARE_MASKS[square]
+            flipped = bitboard.flips(own, opp, square)
+            if move & _CORNERS:
+                group = 0
+            elif move & _X_AND_C_SQUARES:
+                group = 2
+            else:
+                group = 1
+            replies = bitboard.popcount(
+                bitboard.legal_moves(opp ^ flipped, own | flipped | move))
+            ordered.append((group, replies, square, flipped))
+        ordered.sort()
+        return [(square, flipped) for _, _, square, flipped in ordered]
@@ -0,0 +1,169 @@
+"""Balanced opening positions and duplicate game detection for evaluation."""
+import random
+import threading
+
+import numpy as np
+
+
+def canonical_key(game):
+    """Returns a key shared by a position and its 8 symmetric positions."""
+    keys = []
+    for symmetry in range(8):
+        candidate = np.rot90(game.state, symmetry % 4)
+        if symmetry >= 4:
+            candidate = np.fliplr(candidate)
+        keys.append(np.ascontiguousarray(candidate).tobytes())
+    return min(keys), game.current_player
+
+
+def enumerate_openings(game, plies):
+    """Enumerates the positions reached after a number of plies.
+
+    Positions reached by several move orders or symmetric to each other are
+    kept once.
+
+    Args:
+        game: An object containing the start position.
+        plies: The number of moves of every opening.
+
+    Returns:
+        A list of (moves, position) pairs, moves being square indices.
+    """
+    openings = {}
+
+    def expand(position, moves):
+        if len(moves) == plies:
+            openings.setdefault(canonical_key(position), (moves, position))
+            return
+
+        legal_mask, _ = position.get_legal_moves(position.current_player)
+        for square in np.flatnonzero(legal_mask):
+            child = position.clone()
+            child.play_action(int(square))
+            expand(child, moves + [int(square)])
+
+    expand(game.clone(), [])
+    return list(openings.values())
+
+
+def imbalance(position):
+    """Scores how far a position is from even by discs and mobility."""
+    discs = np.sum(position.state == 1) - np.sum(position.state == -1)
+    mobility = (int(np.sum(position.get_legal_moves(1)[0])) -
+                int(np.sum(position.get_legal_moves(-1)[0])))
+    return abs(discs) + abs(mobility)
+
+
+def balanced_openings(game, plies, count, seed=0):
+    """Picks the most balanced openings of a number of plies.
+
+    Args:
+        game: An object containing the start position.
+        plies: The number of moves of every opening.
+        count: The number of openings wanted.
+        seed: The seed breaking ties between equally balanced openings.
+
+    Returns:
+        A list of at most count move lists.
+    """
+    candidates = enumerate_openings(game, plies)
+    random.Random(seed).shuffle(candidates)
+    candidates.sort(key=lambda candidate: imbalance(candidate[1]))
+
+    return [moves for moves, _ in candidates[:count]]
+
+
+def opening_schedule(game, num_games, plies):
+    """Lists the opening and colour of every evaluation game.
+
+    Every opening is played twice in a row, with the first network taking
+    each colour once, starting with the colour to move first.
+
+    Args:
+        game: An object containing the start position.
+        num_games: The number of games to play.
+        plies: The number of moves of every opening, 0 to start from the
+            initial position.
+
+    Returns:
+        A list of (moves, player) pairs, player being the colour of the
+        first network.
+    """
+    openings = [[]]
+    if plies > 0:
+        openings = balanced_openings(game, plies, (num_games + 1) // 2)
+
+    first = game.current_player
+    return [(openings[(i // 2) % len(openings)],
+             first if i % 2 == 0 else -first)
+            for i in range(num_games)]
+
+
+class GameCache(object):
+    """Remembers the games played so far and the positions they reached.
+
+    Searches at the final temperature are nearly deterministic, so a game
+    which repeats the moves of an earlier game with the same networks on the
+    same colours adds no information and is skipped. A game which reaches a
+    position of an earlier game by other moves is a transposition. It is
+    only counted and played to the end, since scoring it with the earlier
+    result would count that result twice.
+
+    Attributes:
+        games: A list with the squares played in every finished game from
+            the initial position.
+        positions: A dict mapping (position hash, colour of the first network)
+            keys to (game index, ply) pairs of the game which reached them.
+        skipped: An integer counting the games skipped as duplicates.
+        transposed: An integer counting the games which transposed into an
+            earlier game.
+        lock: A lock for games played on several threads.
+    """
+
+    def __init__(self):
+        """Initializes GameCache with no games."""
+        self.games = []
+        self.positions = {}
+        self.skipped = 0
+        self.transposed = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, key, moves):
+        """Finds an earlier game which reached a position.
+
+        Args:
+            key: The (position hash, colour of the first network) key of the
+                position.
+            moves: The squares played from the initial position to reach it.
+
+        Returns:
+            None if no earlier game reached the position, otherwise whether
+            the earlier game reached it by the same moves.
+        """
+        with self.lock:
+            entry = self.positions.get(key)
+            if entry is None:
+                return None
+
+            index, ply = entry
+            duplicate = self.games[index][:ply] == tuple(moves)
+            if duplicate:
+                self.skipped += 1
+            else:
+                self.transposed += 1
+            return duplicate
+
+    def add_game(self, keys, moves):
+        """Stores a finished game.
+
+        Args:
+            keys: The position keys reached by the game, one per move of
+                moves after the opening.
+            moves: The squares played from the initial position.
+        """
+        with self.lock:
+            index = len(self.games)
+            self.games.append(tuple(moves))
+            first_ply = len(moves) - len(keys) + 1
+            for ply, key in enumerate(keys, first_ply):
+                self.positions.setdefault(key, (index, ply))
@@ -4,7 +4,11 @@ from collections import Counter
 
 import numpy as np
 
+from config import CFG
 from game import Game
+from othello import bitboard
+from othello.endgame import EndgameSolver
+from othello import zobrist
 
 
 class OthelloGame(Game):
@@ -17,15 +21,25 @@ class OthelloGame(Game):
         state: A list which stores the game state in matrix form.
         action_size: An integer indicating the total number of board squares.
         directions: A dictionary containing tuples to check for valid moves.
+        use_bitboard: A bool to use the bitboard backend for move generation.
+        bitboards: A dictionary mapping each player to its disc bitboard.
+        history: An undo stack of (square, flipped, player) for played moves.
+        hash: An integer Zobrist hash of the discs and the player to move.
+        legal_cache: The last get_legal_moves result with its position key.
     """
 
-    def __init__(self):
+    def __init__(self, use_bitboard=None):
         """Initializes TicTacToeGame with the initial board state."""
         super().__init__()
+        if use_bitboard is None:
+            use_bitboard = CFG.bitboard
+        self.use_bitboard = bool(use_bitboard)
         self.row = 8
         self.column = 8
         self.current_player = -1
         self.state = []
+        self.history = []
+        self.legal_cache = None
         self.action_size = self.row * self.column
 
         # Create a n x n matrix to represent the board
@@ -50,15 +64,21 @@ class OthelloGame(Game):
             7: (1, 1)
         }
 
+        self.bitboards = {1: bitboard.from_state(self.state, 1),
+                          -1: bitboard.from_state(self.state, -1)}
+        self.hash = zobrist.hash_state(self.state, self.current_player)
+
     def clone(self):
         """Creates a deep clone of the game object.
 
         Returns:
             the cloned game object.
         """
-        game_clone = OthelloGame()
+        game_clone = OthelloGame(self.use_bitboard)
         game_clone.state = deepcopy(self.state)
         game_clone.current_player = self.current_player
+        game_clone.bitboards = dict(self.bitboards)
+        game_clone.hash = self.hash
         return game_clone
     
     def is_on_board(self, x, y):
@@ -70,12 +90,28 @@ class OthelloGame(Game):
         """
         return x >= 0 and x <= 7 and y >= 0 and y <= 7
 
-    def play_action(self, action):
+    def play_action(self, action, flipped=None):
         """Plays an action on the game board.
 
         Args:
-            action: A tuple in the form of (row, column, direction).
+            action: A tuple in the form of (row, column, direction), or the
+                integer index of the square played.
+            flipped: The flip set of the move from get_legal_moves. When it
+                is None the cached flip sets or a fresh search are used.
         """
+        if isinstance(action, (int, np.integer)):
+            if not self.use_bitboard:
+                action = self.get_valid_moves(self.current_player)[action]
+            else:
+                if flipped is None:
+                    flipped = self.get_cached_flips(action)
+                self.play_bitboard_action(int(action), flipped)
+                return
+
+        if self.use_bitboard:
+            self.play_bitboard_action(action[1] * self.column + action[2])
+            return
+
         x = action[1]
         y = action[2]
         d = action[3]
@@ -83,6 +119,7 @@ class OthelloGame(Game):
         self.state[x][y] = self.current_player
 
         count = 0
+        flipped = []
 
         # Flip all opponent pieces which are in the sandwich.
         while True:
@@ -91,12 +128,90 @@ class OthelloGame(Game):
 
             if self.state[row][col] == -self.current_player:
                 self.state[row][col] = self.current_player
+                flipped.append((row, col))
                 count += 1
             else:
                 break
 
+        self.history.append((x * self.column + y, flipped,
+                             self.current_player))
+        self.update_hash(x * self.column + y,
+                         [row * self.column + col for row, col in flipped],
+                         self.current_player)
         self.current_player = -self.current_player
-        
+
+    def play_bitboard_action(self, square, flipped=None):
+        """Plays a move with the bitboard backend, flipping in every direction.
+
+        Args:
+            square: The index of the square played, row * column + column.
+            flipped: The precomputed flip set of the move, if known.
+
+        Returns:
+            The bitboard of the flipped discs, empty for an illegal move.
+        """
+        player = self.current_player
+        own = self.bitboards[player]
+        opp = self.bitboards[-player]
+        if flipped is None:
+            flipped = bitboard.flips(own, opp, square)
+        move = bitboard.SQUARE_MASKS[square]
+
+        self.bitboards[player] = own | flipped | move
+        self.bitboards[-player] = opp ^ flipped
+
+        # Keep the matrix form and the hash in sync.
+        key = self.hash ^ zobrist.SIDE ^ zobrist.KEYS[player][square]
+        self.state[square // self.column][square % self.column] = player
+        for flipped_square in bitboard.squares(flipped):
+            self.state[flipped_square // self.column][
+                flipped_square % self.column] = player
+            key ^= zobrist.FLIP_KEYS[flipped_square]
+        self.hash = key
+
+        self.history.append((square, flipped, player))
+        self.current_player = -player
+        return flipped
+
+    def update_hash(self, square, flipped, player):
+        """Toggles a played move into or out of the Zobrist hash.
+
+        Args:
+            square: The index of the square played.
+            flipped: A list of the indexes of the flipped squares.
+            player: The player who played the move.
+        """
+        key = self.hash ^ zobrist.SIDE ^ zobrist.KEYS[player][square]
+        for flipped_square in flipped:
+            key ^= zobrist.FLIP_KEYS[flipped_square]
+        self.hash = key
+
+    def undo_action(self):
+        """Takes back the last played action using the undo stack.
+
+        Restores the played square, the flipped discs and the player to move,
+        so a search can walk down and back up on a single board.
+        """
+        square, flipped, player = self.history.pop()
+
+        self.state[square // self.column][square % self.column] = 0
+
+        if self.use_bitboard:
+            move = bitboard.SQUARE_MASKS[square]
+            self.bitboards[player] ^= flipped | move
+            self.bitboards[-player] |= flipped
+            flipped = [(flipped_square // self.column,
+                        flipped_square % self.column)
+                       for flipped_square in bitboard.squares(flipped)]
+
+        for row, col in flipped:
+            self.state[row][col] = -player
+
+        self.update_hash(square,
+                         [row * self.column + col for row, col in flipped],
+                         player)
+        self.current_player = player
+
     def play_action_human(self, action):
         """Plays an action on the game board.
 
@@ -105,7 +220,18 @@ class OthelloGame(Game):
         """
         xstart = action[1]
         ystart = action[2]
-        
+
+        if self.use_bitboard:
+            if not self.is_on_board(xstart, ystart):
+                return False
+            square = xstart * self.column + ystart
+            legal = bitboard.legal_moves(self.bitboards[self.current_player],
+                                         self.bitboards[-self.current_player])
+            if not legal & bitboard.SQUARE_MASKS[square]:
+                return False
+            self.play_bitboard_action(square)
+            return True
+
         if not self.is_on_board(xstart, ystart) or self.state[xstart][ystart] != 0:
             return False
             
@@ -153,8 +279,91 @@ class OthelloGame(Game):
             x, y = nx,ny
             self.state[x][y] = self.current_player
 
+        self.history.append((xstart * self.column + ystart,
+                             [tuple(flip) for flip in Flip],
+                             self.current_player))
+        self.update_hash(xstart * self.column + ystart,
+                         [x * self.column + y for x, y in Flip],
+                         self.current_player)
         self.current_player = -self.current_player
 
+    def get_legal_moves(self, current_player):
+        """Returns a fixed-shape legal move mask and the flip set of each move.
+
+        The result is cached for the current position, so calling it again or
+        playing one of the moves with play_action does not search again.
+
+        Args:
+            current_player: An integer representing the player to move.
+
+        Returns:
+            A uint8 array of length action_size with 1 on legal moves, and a
+            list with the flipped disc bitboard of every square (0 where the
+            move is illegal). The flip sets are None with the array backend.
+        """
+        key = (self.hash, current_player)
+        if self.legal_cache is not None and self.legal_cache[0] == key:
+            return self.legal_cache[1], self.legal_cache[2]
+
+        if self.use_bitboard:
+            own = self.bitboards[current_player]
+            opp = self.bitboards[-current_player]
+            legal = bitboard.legal_moves(own, opp)
+            mask = np.unpackbits(
+                np.frombuffer(legal.to_bytes(8, "little"), dtype=np.uint8),
+                bitorder="little")
+            flip_sets = [0] * self.action_size
+            for square in bitboard.squares(legal):
+                flip_sets[square] = bitboard.flips(own, opp, square)
+        else:
+            mask = np.zeros(self.action_size, dtype=np.uint8)
+            valid_moves = self.get_valid_moves(current_player)
+            mask[:] = [move[0] == 1 for move in valid_moves]
+            flip_sets = None
+
+        self.legal_cache = (key, mask, flip_sets)
+        return mask, flip_sets
+
+    def get_cached_flips(self, square):
+        """Returns the cached flip set of a move of the player to move.
+
+        Args:
+            square: The index of the square played.
+
+        Returns:
+            The flipped disc bitboard, or None if it is not cached.
+        """
+        if (self.legal_cache is not None and
+                self.legal_cache[0] == (self.hash, self.current_player) and
+                self.legal_cache[2] is not None):
+            return self.legal_cache[2][square]
+        return None
+
+    def solve_endgame(self, max_empties, solver=None):
+        """Solves the position exactly if few enough squares are empty.
+
+        Args:
+            max_empties: The largest number of empty squares to solve.
+            solver: An optional EndgameSolver whose hash table is reused.
+
+        Returns:
+            A tuple (action, score) with the square index of the best move
+            and the final disc difference for the player to move, or None if
+            the position is not solved.
+        """
+        own = self.bitboards[self.current_player]
+        opp = self.bitboards[-self.current_player]
+        empties = self.action_size - bitboard.popcount(own | opp)
+        if not self.use_bitboard or empties > max_empties:
+            return None
+
+        if solver is None:
+            solver = EndgameSolver()
+        square, score = solver.solve(own, opp)
+        if square is None:
+            return None
+        return square, score
+
     def get_valid_moves(self, current_player):
         """Returns a list of moves along with their validity.
 
@@ -163,6 +372,9 @@ class OthelloGame(Game):
         Returns:
             A list containing moves as (validity, row, column, direction).
         """
+        if self.use_bitboard:
+            return self.get_bitboard_valid_moves(current_player)
+
         valid_moves = []
 
         pl = current_player
@@ -210,7 +422,25 @@ class OthelloGame(Game):
                 if not found:
                     valid_moves.append((0, None, None, None))
 
-        return np.array(valid_moves)
+        return np.array(valid_moves, dtype=object)
+
+    def get_bitboard_valid_moves(self, current_player):
+        """Returns the valid moves in the get_valid_moves format from bitboards.
+
+        The direction entry is not needed to play a bitboard move, so it is
+        left as None.
+
+        Returns:
+            A list containing moves as (validity, row, column, direction).
+        """
+        legal = bitboard.legal_moves(self.bitboards[current_player],
+                                     self.bitboards[-current_player])
+        valid_moves = np.empty((self.action_size, 4), dtype=object)
+        valid_moves[:, 0] = 0
+        for square in bitboard.squares(legal):
+            valid_moves[square] = (1, square // self.column,
+                                   square % self.column, None)
+        return valid_moves
 
     def check_game_over(self, current_player):
         """Checks if the game is over and return a possible winner.
@@ -231,6 +461,22 @@ class OthelloGame(Game):
         player_a = current_player
         player_b = -current_player
 
+        if self.use_bitboard:
+            own = self.bitboards[player_a]
+            opp = self.bitboards[player_b]
+            if bitboard.legal_moves(own, opp) and bitboard.legal_moves(opp,
+                                                                         own):
+                return False, 0
+
+            piece_count_a = bitboard.popcount(own)
+            piece_count_b = bitboard.popcount(opp)
+            if piece_count_a > piece_count_b:
+                return True, 1
+            elif piece_count_a == piece_count_b:
+                return True, 0
+            else:
+                return True, -1
+
         player_a_moves = self.get_valid_moves(player_a)
         player_b_moves = self.get_valid_moves(player_b)
 
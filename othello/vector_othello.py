@@ -0,0 +1,258 @@
+"""Vectorized Othello environment playing many boards in lockstep."""
+import numpy as np
+
+from othello import bitboard
+from othello import zobrist
+from othello.othello_game import OthelloGame
+
+_FULL = np.uint64(bitboard.FULL)
+_ONE = np.uint64(1)
+_DIRECTIONS = tuple((np.uint64(abs(amount)), amount > 0, np.uint64(mask))
+                    for _, _, amount, mask in bitboard.DIRECTIONS)
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)],
+                           dtype=np.uint8)
+
+
+def _shift(boards, amount, left, mask):
+    """Shifts an array of bitboards one step in a direction."""
+    if left:
+        return np.left_shift(boards, amount) & mask
+    return np.right_shift(boards, amount) & mask
+
+
+def popcount(boards):
+    """Counts the discs on every bitboard of an array.
+
+    Args:
+        boards: A uint64 array of bitboards.
+
+    Returns:
+        An int array of disc counts.
+    """
+    as_bytes = np.ascontiguousarray(boards, dtype="<u8").view(np.uint8)
+    return _POPCOUNT_TABLE[as_bytes].reshape(-1, 8).sum(axis=1, dtype=np.int64)
+
+
+def unpack(boards):
+    """Expands an array of bitboards into a (N, 64) array of bits.
+
+    Args:
+        boards: A uint64 array of bitboards.
+
+    Returns:
+        A uint8 array with one row of 64 square bits per bitboard.
+    """
+    as_bytes = np.ascontiguousarray(boards, dtype="<u8").view(np.uint8)
+    return np.unpackbits(as_bytes.reshape(-1, 8), axis=1, bitorder="little")
+
+
+def legal_moves(own, opp):
+    """Generates the legal move bitboards for arrays of positions.
+
+    Args:
+        own: A uint64 array of bitboards of the players to move.
+        opp: A uint64 array of bitboards of the opponents.
+
+    Returns:
+        A uint64 array with a bit set on every legal move of each board.
+    """
+    empty = ~(own | opp) & _FULL
+    moves = np.zeros_like(own)
+    for amount, left, mask in _DIRECTIONS:
+        line = _shift(own, amount, left, mask) & opp
+        for _ in range(5):
+            line |= _shift(line, amount, left, mask) & opp
+        moves |= _shift(line, amount, left, mask) & empty
+    return moves
+
+
+def flips(own, opp, moves):
+    """Computes the discs flipped by one move on each board.
+
+    Args:
+        own: A uint64 array of bitboards of the players to move.
+        opp: A uint64 array of bitboards of the opponents.
+        moves: A uint64 array with the single bit of the move of each board.
+
+    Returns:
+        A uint64 array of the flipped discs of each board.
+    """
+    flipped = np.zeros_like(own)
+    for amount, left, mask in _DIRECTIONS:
+        line = np.zeros_like(own)
+        bounded = np.zeros_like(own)
+        cursor = _shift(moves, amount, left, mask)
+        for _ in range(7):
+            bounded |= cursor & own
+            cursor &= opp
+            line |= cursor
+            cursor = _shift(cursor, amount, left, mask)
+        flipped |= np.where(bounded != 0, line, np.uint64(0))
+    return flipped
+
+
+class VectorOthello(object):
+    """Represents N Othello boards stored as packed uint64 bitboards.
+
+    Every operation works on all boards at once and follows the rules of
+    OthelloGame with the bitboard backend.
+
+    Attributes:
+        num_boards: An integer for the number of boards.
+        row: An integer indicating the length of the board row.
+        column: An integer indicating the length of the board column.
+        action_size: An integer indicating the total number of board squares.
+        black: A uint64 array of the discs of player 1 on each board.
+        white: A uint64 array of the discs of player -1 on each board.
+        current_player: An int8 array of the player to move on each board.
+    """
+
+    def __init__(self, num_boards):
+        """Initializes VectorOthello with N boards in the initial position."""
+        self.num_boards = num_boards
+        self.row = 8
+        self.column = 8
+        self.action_size = self.row * self.column
+        self.black = None
+        self.white = None
+        self.current_player = None
+        self.reset()
+
+    def reset(self):
+        """Sets every board back to the initial position."""
+        game = OthelloGame(use_bitboard=True)
+        self.black = np.full(self.num_boards, game.bitboards[1],
+                             dtype=np.uint64)
+        self.white = np.full(self.num_boards, game.bitboards[-1],
+                             dtype=np.uint64)
+        self.current_player = np.full(self.num_boards, game.current_player,
+                                      dtype=np.int8)
+
+    @classmethod
+    def from_games(cls, games):
+        """Builds a VectorOthello holding the positions of OthelloGames.
+
+        Args:
+            games: A list of OthelloGame objects using the bitboard backend.
+
+        Returns:
+            A VectorOthello with one board per game.
+        """
+        vector = cls(len(games))
+        vector.black = np.array([game.bitboards[1] for game in games],
+                                dtype=np.uint64)
+        vector.white = np.array([game.bitboards[-1] for game in games],
+                                dtype=np.uint64)
+        vector.current_player = np.array(
+            [game.current_player for game in games], dtype=np.int8)
+        return vector
+
+    def to_game(self, index):
+        """Creates an OthelloGame with the position of one board.
+
+        Args:
+            index: The index of the board.
+
+        Returns:
+            An OthelloGame using the bitboard backend.
+        """
+        game = OthelloGame(use_bitboard=True)
+        game.state = self.states()[index].astype(game.state.dtype)
+        game.bitboards = {1: int(self.black[index]),
+                          -1: int(self.white[index])}
+        game.current_player = int(self.current_player[index])
+        game.hash = zobrist.hash_state(game.state, game.current_player)
+        return game
+
+    def players(self):
+        """Returns the bitboards of the players to move and their opponents.
+
+        Returns:
+            A tuple of uint64 arrays (own, opp).
+        """
+        to_move_black = self.current_player == 1
+        own = np.where(to_move_black, self.black, self.white)
+        opp = np.where(to_move_black, self.white, self.black)
+        return own, opp
+
+    def legal_moves(self):
+        """Returns the legal move bitboard of the player to move per board.
+
+        Returns:
+            A uint64 array of legal move bitboards.
+        """
+        own, opp = self.players()
+        return legal_moves(own, opp)
+
+    def legal_mask(self):
+        """Returns the legal moves of the player to move as a boolean mask.
+
+        Returns:
+            A (N, action_size) bool array.
+        """
+        return unpack(self.legal_moves()).astype(bool)
+
+    def play(self, squares):
+        """Plays one move on each board.
+
+        Args:
+            squares: An int array with the square played on each board.
+                Boards with a negative square are left unchanged.
+
+        Returns:
+            A uint64 array of the flipped discs of each board.
+        """
+        squares = np.asarray(squares, dtype=np.int64)
+        active = squares >= 0
+        moves = np.where(active,
+                         np.left_shift(_ONE,
+                                       np.maximum(squares, 0).astype(
+                                           np.uint64)),
+                         np.uint64(0))
+
+        own, opp = self.players()
+        flipped = flips(own, opp, moves)
+        own = own | flipped | moves
+        opp = opp ^ flipped
+
+        to_move_black = self.current_player == 1
+        self.black = np.where(to_move_black, own, opp)
+        self.white = np.where(to_move_black, opp, own)
+        self.current_player = np.where(active, -self.current_player,
+                                       self.current_player).astype(np.int8)
+        return flipped
+
+    def scores(self):
+        """Counts the discs of both players on each board.
+
+        Returns:
+            A tuple of int arrays (player 1 discs, player -1 discs).
+        """
+        return popcount(self.black), popcount(self.white)
+
+    def check_game_over(self):
+        """Checks every board for the end of the game.
+
+        A board is over when either player has no legal move, as in
+        OthelloGame.check_game_over.
+
+        Returns:
+            A bool array of game over states and an int array of results from
+            the view of the player to move (win: 1, loss: -1, draw: 0).
+        """
+        own, opp = self.players()
+        game_over = ((legal_moves(own, opp) == 0) |
+                     (legal_moves(opp, own) == 0))
+        difference = popcount(own) - popcount(opp)
+        values = np.where(game_over, np.sign(difference), 0).astype(np.int64)
+        return game_over, values
+
+    def states(self):
+        """Returns the boards in matrix form for the network.
+
+        Returns:
+            A (N, row, column) int8 array with 1, -1 and 0 entries.
+        """
+        states = (unpack(self.black).astype(np.int8) -
+                  unpack(self.white).astype(np.int8))
+        return states.reshape(self.num_boards, self.row, self.column)
@@ -0,0 +1,30 @@
+"""Zobrist keys for incremental Othello position hashing."""
+import random
+
+_rng = random.Random(20180501)
+
+# One random 64-bit key per (player, square) and one for the side to move.
+KEYS = {1: tuple(_rng.getrandbits(64) for _ in range(64)),
+        -1: tuple(_rng.getrandbits(64) for _ in range(64))}
+SIDE = _rng.getrandbits(64)
+
+# Key toggled when a disc on a square changes colour.
+FLIP_KEYS = tuple(KEYS[1][i] ^ KEYS[-1][i] for i in range(64))
+
+
+def hash_state(state, current_player):
+    """Computes the Zobrist hash of a position from scratch.
+
+    Args:
+        state: An 8 x 8 matrix with 1, -1 and 0 entries.
+        current_player: The player to move.
+
+    Returns:
+        A 64-bit integer hash of the discs and the side to move.
+    """
+    key = SIDE if current_player == 1 else 0
+    for x in range(8):
+        for y in range(8):
+            if state[x][y] != 0:
+                key ^= KEYS[int(state[x][y])][x * 8 + y]
+    return key
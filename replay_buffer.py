@@ -0,0 +1,159 @@
+"""Sliding window of self-play positions stored on disk."""
+import os
+import re
+
+import numpy as np
+
+CHUNK_PATTERN = re.compile(r"^iteration_(\d+)\.npy$")
+
+
+def example_dtype(row, column, action_size):
+    """Returns the record layout of one compact training example.
+
+    Boards are stored as int8 and search probabilities and values as
+    float16, about a fifth of the memory of the float64 lists they come
+    from.
+
+    Args:
+        row: An integer for the number of board rows.
+        column: An integer for the number of board columns.
+        action_size: An integer for the length of the policy vector.
+    """
+    return np.dtype([("state", np.int8, (row, column)),
+                     ("pi", np.float16, (action_size,)),
+                     ("v", np.float16)])
+
+
+def to_records(training_data, dtype):
+    """Packs (state, pi, v) examples into compact records.
+
+    Args:
+        training_data: A list of (state, pi, v) examples from self-play.
+        dtype: The record layout returned by example_dtype.
+
+    Returns:
+        A structured array with one record per example.
+    """
+    records = np.empty(len(training_data), dtype=dtype)
+    for i, (state, pi, v) in enumerate(training_data):
+        records[i] = (state, pi, v)
+    return records
+
+
+def write_records(file_path, records):
+    """Writes records to a .npy file atomically.
+
+    The records go to a temporary file first, so that readers and
+    interrupted runs never see a partial file.
+
+    Args:
+        file_path: The path of the .npy file.
+        records: A structured array of examples.
+    """
+    temp_path = file_path + ".tmp"
+    with open(temp_path, "wb") as records_file:
+        np.save(records_file, records)
+    os.replace(temp_path, file_path)
+
+
+class ReplayBuffer(object):
+    """Keeps the self-play positions of the last iterations on disk.
+
+    Every iteration is written to its own memory-mapped .npy file, so the
+    buffer survives restarts and only the sampled examples are read into
+    memory. Files older than the window are deleted.
+
+    Attributes:
+        directory: The directory holding the iteration files.
+        max_iterations: The number of iterations kept.
+        dtype: The record layout of one example.
+        chunks: A list of (iteration, memory-mapped records) pairs, oldest
+            first.
+    """
+
+    def __init__(self, directory, max_iterations, row, column, action_size):
+        """Initializes ReplayBuffer with the files already on disk."""
+        self.directory = directory
+        self.max_iterations = max_iterations
+        self.dtype = example_dtype(row, column, action_size)
+        self.chunks = []
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        for filename in sorted(os.listdir(directory)):
+            match = CHUNK_PATTERN.match(filename)
+            if match:
+                records = np.load(os.path.join(directory, filename),
+                                  mmap_mode="r")
+                if records.dtype == self.dtype:
+                    self.chunks.append((int(match.group(1)), records))
+        self.trim()
+
+    def __len__(self):
+        """Returns the number of examples in the window."""
+        return sum(len(records) for _, records in self.chunks)
+
+    def add(self, training_data):
+        """Stores the examples of a new iteration.
+
+        Args:
+            training_data: A list of (state, pi, v) examples from self-play.
+        """
+        self.add_records(to_records(training_data, self.dtype))
+
+    def add_records(self, records):
+        """Stores already packed examples as a new iteration.
+
+        Args:
+            records: A structured array with the layout of dtype.
+        """
+        iteration = self.chunks[-1][0] + 1 if self.chunks else 0
+        file_path = os.path.join(self.directory,
+                                 "iteration_%06d.npy" % iteration)
+        write_records(file_path, records)
+
+        self.chunks.append((iteration, np.load(file_path, mmap_mode="r")))
+        self.trim()
+
+    def trim(self):
+        """Deletes the iterations that fell out of the window."""
+        while len(self.chunks) > self.max_iterations:
+            iteration, _ = self.chunks.pop(0)
+            os.remove(os.path.join(self.directory,
+                                   "iteration_%06d.npy" % iteration))
+
+    def sample(self, num_examples=0):
+        """Draws training examples from the window without replacement.
+
+        Args:
+            num_examples: The number of examples, 0 for all of them.
+
+        Returns:
+            Float32 arrays of states, pis and vs.
+        """
+        total = len(self)
+        if num_examples <= 0 or num_examples >= total:
+            indices = np.arange(total)
+        else:
+            indices = np.sort(np.random.choice(total, num_examples,
+                                               replace=False))
+
+        parts = []
+        offset = 0
+        for _, records in self.chunks:
+            # Reading sorted indices keeps the access to each file
+            # sequential.
+            local = indices[(indices >= offset) &
+                            (indices < offset + len(records))] - offset
+            parts.append(records[local])
+            offset += len(records)
+
+        if parts:
+            records = np.concatenate(parts)
+        else:
+            records = np.empty(0, dtype=self.dtype)
+
+        return (records["state"].astype(np.float32),
+                records["pi"].astype(np.float32),
+                records["v"].astype(np.float32))
@@ -0,0 +1,235 @@
+"""Multi-process self-play workers."""
+import os
+import queue
+import time
+
+from config import CFG
+from inference_server import InferenceServer
+
+
+def self_play_worker(index, config, commands, tasks, results, net=None):
+    """Plays self-play games from a task queue in a worker process.
+
+    Each worker builds its own MonteCarloTreeSearch and either its own
+    network or uses a client of the inference server. The worker lives for
+    the whole run: for every iteration it reloads the weights in place and
+    then plays games until it takes a None task.
+
+    Args:
+        index: The index of the worker.
+        config: A dictionary of CFG values from the main process.
+        commands: A queue of (checkpoint path, network id) pairs starting an
+            iteration, None to stop.
+        tasks: A queue of game numbers, None to end the iteration.
+        results: A queue receiving (index, game number, training data, cache
+            hits, cache misses) for every game, and (index, None, None, 0, 0)
+            when the worker took its None task.
+        net: An optional RemoteNetwork to use instead of a local network.
+    """
+    for name, value in config.items():
+        setattr(CFG, name, value)
+
+    if CFG.pin_cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {index % os.cpu_count()})
+
+    # Imported here so that TensorFlow is only loaded in the worker.
+    from othello.othello_game import OthelloGame
+    from train import Train
+
+    game = OthelloGame()
+    remote = net is not None
+    if not remote:
+        from neural_net import NeuralNetworkWrapper
+        net = NeuralNetworkWrapper(game)
+    trainer = Train(game, net)
+
+    while True:
+        command = commands.get()
+        if command is None:
+            break
+        model_path, trainer.network_id = command
+        if not remote:
+            # Reloading also clears the evaluation cache and its counters.
+            net.load_inference_model(model_path)
+
+        while True:
+            game_number = tasks.get()
+            if game_number is None:
+                results.put((index, None, None, 0, 0))
+                break
+            training_data = []
+            trainer.play_game(game.clone(), training_data)
+            hits = misses = 0
+            if net.cache is not None:
+                hits, misses = net.cache.hits, net.cache.misses
+            results.put((index, game_number, training_data, hits, misses))
+
+
+def worker_config(num_workers):
+    """Returns the CFG values handed to worker processes.
+
+    The evaluation cache memory is split between the workers, so that
+    adding workers does not multiply it.
+
+    Args:
+        num_workers: The number of worker processes.
+
+    Returns:
+        A dictionary of CFG names and values.
+    """
+    config = {name: value for name, value in vars(CFG).items()
+              if not name.startswith("__")}
+    config["eval_cache_mb"] = CFG.eval_cache_mb / max(num_workers, 1)
+    return config
+
+
+class ResourceMeter(object):
+    """Measures wall time, CPU time and CPU utilisation of a run.
+
+    CPU time counts this process and every child process which has been
+    joined, so workers must have exited before the report.
+
+    Attributes:
+        start_times: The os.times() at the start of the run.
+    """
+
+    def __init__(self):
+        """Initializes ResourceMeter and starts measuring."""
+        self.start_times = os.times()
+
+    def report(self, num_games):
+        """Prints games/hour and CPU utilisation since the start.
+
+        Args:
+            num_games: The number of self-play games played.
+
+        Returns:
+            The games per hour and the CPU utilisation as a fraction of all
+            cores.
+        """
+        end_times = os.times()
+        wall = max(end_times.elapsed - self.start_times.elapsed, 1e-9)
+        cpu = sum(end_times[:4]) - sum(self.start_times[:4])
+        games_per_hour = num_games * 3600 / wall
+        utilisation = cpu / (wall * (os.cpu_count() or 1))
+
+        print("Run: %d games in %.1fs (%.1f games/hour), CPU time %.1fs, "
+              "CPU utilisation %.1f%% of %d cores"
+              % (num_games, wall, games_per_hour, cpu, utilisation * 100,
+                 os.cpu_count() or 1))
+        return games_per_hour, utilisation
+
+
+class SelfPlayPool(object):
+    """Plays self-play games on a pool of worker processes.
+
+    The workers, and the inference server if there is one, are started once
+    and only reload the weights between iterations.
+
+    Attributes:
+        num_workers: An integer for the number of worker processes.
+        cache_hits: An integer counting evaluation cache hits of the workers.
+        cache_misses: An integer counting evaluation cache misses of the
+            workers.
+        server: An InferenceServer shared by the workers, or None when
+            every worker holds its own network.
+        commands: A list with the command queue of every worker.
+        tasks: The queue of game numbers shared by the workers.
+        results: The queue of finished games.
+        workers: The list of worker processes.
+    """
+
+    def __init__(self, num_workers, use_server=False):
+        """Initializes SelfPlayPool and starts its workers."""
+        import multiprocessing
+
+        self.num_workers = num_workers
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.server = None
+        if use_server:
+            self.server = InferenceServer(num_workers)
+            self.server.start()
+
+        # TensorFlow is not fork safe, so workers start fresh interpreters.
+        context = multiprocessing.get_context("spawn")
+        self.commands = [context.Queue() for _ in range(num_workers)]
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        config = worker_config(num_workers)
+
+        # Daemonic, so that an error in the main process does not leave it
+        # waiting for the workers at exit.
+        self.workers = [context.Process(
+            target=self_play_worker,
+            args=(index, config, self.commands[index], self.tasks,
+                  self.results,
+                  None if self.server is None else self.server.clients[index]),
+            daemon=True)
+            for index in range(num_workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def play(self, model_path, num_games, training_data, network_id=0):
+        """Plays games with the given network and streams in their data.
+
+        Args:
+            model_path: The checkpoint path of the network to play with.
+            num_games: The number of games to play.
+            training_data: A list extended with each game's data as soon as
+                the game finishes.
+            network_id: An integer identifying the network in game records.
+        """
+        if self.server is not None:
+            self.server.load_model(model_path)
+
+        for commands in self.commands:
+            commands.put((model_path, network_id))
+        for game_number in range(num_games):
+            self.tasks.put(game_number)
+        for _ in self.workers:
+            self.tasks.put(None)
+
+        # Every worker must take exactly one None, otherwise a None left in
+        # the queue would stop a worker at the start of the next iteration.
+        cache_stats = {}
+        finished = 0
+        stopped = 0
+        while finished < num_games or stopped < len(self.workers):
+            try:
+                index, game_number, data, hits, misses = self.results.get(
+                    timeout=1)
+            except queue.Empty:
+                if not all(worker.is_alive() for worker in self.workers):
+                    raise RuntimeError("A self-play worker exited before "
+                                       "finishing all games.")
+                if self.server is not None and not self.server.is_alive():
+                    raise RuntimeError("The inference server exited before "
+                                       "finishing all games.")
+                continue
+            if game_number is None:
+                stopped += 1
+                continue
+            training_data.extend(data)
+            cache_stats[index] = (hits, misses)
+            finished += 1
+            print("Finished Self-Play Game", game_number + 1,
+                  "on worker", index)
+
+        self.cache_hits = sum(stats[0] for stats in cache_stats.values())
+        self.cache_misses = sum(stats[1] for stats in cache_stats.values())
+
+        if self.server is not None:
+            metrics = self.server.stats()
+            self.cache_hits = metrics.get("cache_hits", 0)
+            self.cache_misses = metrics.get("cache_misses", 0)
+            print("Inference server:", metrics)
+
+    def close(self):
+        """Stops the workers and the inference server if there is one."""
+        for commands in self.commands:
+            commands.put(None)
+        for worker in self.workers:
+            worker.join()
+        if self.server is not None and self.server.is_alive():
+            self.server.stop()
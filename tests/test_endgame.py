@@ -0,0 +1,62 @@
+"""Tests of the exact endgame solver."""
+import random
+
+import numpy as np
+
+from othello import bitboard
+from othello.endgame import EndgameSolver
+from othello.othello_game import OthelloGame
+
+
+def brute_force(own, opp):
+    """Returns the exact disc difference by searching every move."""
+    moves = bitboard.legal_moves(own, opp)
+    if not moves or not bitboard.legal_moves(opp, own):
+        return bitboard.popcount(own) - bitboard.popcount(opp)
+    best = -65
+    for square in bitboard.squares(moves):
+        flipped = bitboard.flips(own, opp, square)
+        move = bitboard.SQUARE_MASKS[square]
+        best = max(best, -brute_force(opp ^ flipped, own | flipped | move))
+    return best
+
+
+def endgame_positions(count, empties, seed):
+    """Plays random games until empties squares are left."""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        game = OthelloGame(use_bitboard=True)
+        while not game.check_game_over(game.current_player)[0]:
+            own = game.bitboards[game.current_player]
+            opp = game.bitboards[-game.current_player]
+            if game.action_size - bitboard.popcount(own | opp) <= empties:
+                positions.append(game)
+                break
+            legal_mask, _ = game.get_legal_moves(game.current_player)
+            game.play_action(int(rng.choice(np.flatnonzero(legal_mask))))
+    return positions
+
+
+def test_solver_matches_brute_force():
+    solver = EndgameSolver()
+    for game in endgame_positions(12, 8, seed=0):
+        own = game.bitboards[game.current_player]
+        opp = game.bitboards[-game.current_player]
+        square, score = solver.solve(own, opp)
+        assert score == brute_force(own, opp)
+
+        # The chosen move must reach the solved score.
+        flipped = bitboard.flips(own, opp, square)
+        move = bitboard.SQUARE_MASKS[square]
+        assert -brute_force(opp ^ flipped, own | flipped | move) == score
+
+
+def test_solve_endgame_respects_max_empties():
+    game = endgame_positions(1, 8, seed=1)[0]
+    assert game.solve_endgame(4) is None
+    action, score = game.solve_endgame(8)
+    own = game.bitboards[game.current_player]
+    opp = game.bitboards[-game.current_player]
+    assert score == brute_force(own, opp)
+    assert game.get_legal_moves(game.current_player)[0][action] == 1
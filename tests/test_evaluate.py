@@ -0,0 +1,84 @@
+"""Tests of the sequential probability ratio test used for gating."""
+import math
+import threading
+
+import pytest
+
+from config import CFG
+from evaluate import Evaluate, sprt_bounds, sprt_llr
+from mcts import MonteCarloTreeSearch
+from othello.othello_game import OthelloGame
+
+
+def test_sprt_bounds():
+    lower, upper = sprt_bounds(0.05, 0.05)
+    assert lower == pytest.approx(math.log(0.05 / 0.95))
+    assert upper == pytest.approx(math.log(0.95 / 0.05))
+
+    lower, upper = sprt_bounds(0.05, 0.2)
+    assert lower == pytest.approx(math.log(0.2 / 0.95))
+    assert upper == pytest.approx(math.log(0.8 / 0.05))
+    assert lower < 0 < upper
+
+
+def test_sprt_llr():
+    p0, p1 = 0.5, 0.6
+    assert sprt_llr(0, 0, 0, p0, p1) == 0
+    assert sprt_llr(1, 0, 0, p0, p1) == pytest.approx(math.log(p1 / p0))
+    assert sprt_llr(0, 1, 0, p0, p1) == pytest.approx(
+        math.log((1 - p1) / (1 - p0)))
+    # A draw counts as half a win and half a loss.
+    assert sprt_llr(0, 0, 2, p0, p1) == pytest.approx(
+        sprt_llr(1, 1, 0, p0, p1))
+
+
+def test_sprt_decides_clear_results():
+    lower, upper = sprt_bounds(0.05, 0.05)
+    assert sprt_llr(60, 20, 0, 0.5, 0.6) >= upper
+    assert sprt_llr(20, 60, 0, 0.5, 0.6) <= lower
+
+
+class ScriptedEvaluate(Evaluate):
+    """An Evaluate whose games return results from a fixed stream."""
+
+    def __init__(self, results):
+        Evaluate.__init__(self, MonteCarloTreeSearch(None),
+                          MonteCarloTreeSearch(None), OthelloGame())
+        self.results = iter(results)
+        self.lock = threading.Lock()
+        self.played = 0
+
+    def play_game(self, current_mcts, eval_mcts, current_player, stop,
+                  opening=(), cache=None, verbose=False):
+        with self.lock:
+            self.played += 1
+            return next(self.results)
+
+
+@pytest.fixture
+def gate_config():
+    """Restores the gating settings changed by a test."""
+    names = ("sprt_max_games", "eval_workers", "opening_plies",
+             "skip_duplicate_games")
+    saved = {name: getattr(CFG, name) for name in names}
+    CFG.opening_plies = 0
+    CFG.skip_duplicate_games = 0
+    yield
+    for name, value in saved.items():
+        setattr(CFG, name, value)
+
+
+@pytest.mark.parametrize("eval_workers", [1, 4])
+def test_gate_stops_early_on_lopsided_results(gate_config, eval_workers):
+    CFG.eval_workers = eval_workers
+    evaluator = ScriptedEvaluate([1] * CFG.sprt_max_games)
+    accepted, wins, losses, draws = evaluator.gate()
+    assert accepted
+    assert (wins, losses, draws) == (9, 0, 0)
+    assert evaluator.played < 9 + eval_workers
+
+    evaluator = ScriptedEvaluate([-1] * CFG.sprt_max_games)
+    accepted, wins, losses, draws = evaluator.gate()
+    assert not accepted
+    assert (wins, losses, draws) == (0, 7, 0)
+    assert evaluator.played < 7 + eval_workers
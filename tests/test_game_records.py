@@ -0,0 +1,81 @@
+"""Tests of the compact binary game records."""
+import random
+
+import numpy as np
+
+from game_records import (PROBABILITY_SCALE, GameRecordWriter,
+                          read_records, read_training_data)
+from othello.othello_game import OthelloGame
+
+
+def random_game(game, rng):
+    """Plays a random game and returns its moves, policies and result."""
+    game = game.clone()
+    first_player = game.current_player
+    moves = []
+    pis = []
+    while not game.check_game_over(game.current_player)[0]:
+        legal_mask, _ = game.get_legal_moves(game.current_player)
+        pi = np.zeros(game.action_size)
+        legal = np.flatnonzero(legal_mask)
+        pi[legal] = [rng.random() for _ in legal]
+        pis.append(pi / pi.sum())
+        moves.append(int(rng.choice(legal)))
+        game.play_action(moves[-1])
+    return moves, pis, game.check_game_over(first_player)[1]
+
+
+def test_records_round_trip(tmp_path):
+    rng = random.Random(4)
+    game = OthelloGame()
+    file_path = str(tmp_path / "games" / "selfplay.bin")
+    games = [random_game(game, rng) for _ in range(3)]
+
+    writer = GameRecordWriter(game, file_path)
+    for network_id, (moves, pis, result) in enumerate(games):
+        writer.write_game(moves, pis, result, network_id)
+    writer.close()
+
+    records = list(read_records(file_path))
+    assert len(records) == len(games)
+    for network_id, (record, (moves, _, result)) in enumerate(
+            zip(records, games)):
+        assert record[0] == network_id
+        assert record[1] == result
+        assert list(record[2]) == moves
+
+    training_data, num_games = read_training_data(
+        game, str(tmp_path / "games" / "*.bin"))
+    assert num_games == len(games)
+
+    replay = game.clone()
+    examples = iter(training_data)
+    for moves, pis, result in games:
+        replay = game.clone()
+        for square, pi in zip(moves, pis):
+            state, restored_pi, v = next(examples)
+            assert np.array_equal(state, replay.state)
+            assert np.abs(restored_pi - pi).max() < 2.0 / PROBABILITY_SCALE
+            assert v == (result if replay.current_player ==
+                         game.current_player else -result)
+            replay.play_action(square)
+    assert next(examples, None) is None
+
+
+def test_truncated_record_is_ignored(tmp_path):
+    rng = random.Random(5)
+    game = OthelloGame()
+    file_path = str(tmp_path / "selfplay.bin")
+
+    writer = GameRecordWriter(game, file_path)
+    for _ in range(2):
+        moves, pis, result = random_game(game, rng)
+        writer.write_game(moves, pis, result, 0)
+    writer.close()
+
+    with open(file_path, "rb") as record_file:
+        data = record_file.read()
+    with open(file_path, "wb") as record_file:
+        record_file.write(data[:-3])
+
+    assert len(list(read_records(file_path))) == 1
@@ -0,0 +1,95 @@
+"""Tests of the batching and timeouts of the inference server."""
+import queue
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from config import CFG
+from inference_server import RemoteNetwork, gather_batch
+
+
+def request(sent, count=1):
+    """Builds a request of count empty positions sent at a given time."""
+    return (0, sent, np.zeros((count, 8, 8), dtype=np.float32), [1] * count)
+
+
+def test_deadline_counts_time_spent_queued():
+    requests = queue.Queue()
+    requests.put(request(time.time() - 1))
+    requests.put(request(time.time()))
+
+    start = time.time()
+    batch, size = gather_batch(requests, 64, 0.5)
+
+    assert time.time() - start < 0.25
+    assert (len(batch), size) == (2, 2)
+
+
+def test_batch_waits_for_late_requests_until_deadline():
+    requests = queue.Queue()
+    requests.put(request(time.time()))
+    timer = threading.Timer(0.05, lambda: requests.put(request(time.time())))
+    timer.start()
+
+    start = time.time()
+    batch, size = gather_batch(requests, 64, 0.3)
+    timer.join()
+
+    assert time.time() - start >= 0.25
+    assert (len(batch), size) == (2, 2)
+
+
+def test_batch_closes_at_max_batch():
+    requests = queue.Queue()
+    for _ in range(3):
+        requests.put(request(time.time(), count=2))
+
+    batch, size = gather_batch(requests, 3, 1.0)
+
+    assert (len(batch), size) == (2, 4)
+    assert requests.qsize() == 1
+
+
+def test_empty_queue_gives_empty_batch():
+    assert gather_batch(queue.Queue(), 64, 0.1, poll=0.01) == ([], 0)
+
+
+@pytest.fixture
+def short_timeout():
+    """Shortens the wait for a server answer."""
+    saved = CFG.inference_timeout_s
+    CFG.inference_timeout_s = 0.2
+    yield
+    CFG.inference_timeout_s = saved
+
+
+def test_client_times_out_without_answer(short_timeout):
+    net = RemoteNetwork(0, queue.Queue(), queue.Queue(), threading.Event())
+
+    with pytest.raises(RuntimeError, match="No answer"):
+        net.predict(np.zeros((8, 8)), 1)
+
+
+def test_client_fails_when_server_stopped(short_timeout):
+    CFG.inference_timeout_s = 60
+    stopped = threading.Event()
+    stopped.set()
+    net = RemoteNetwork(0, queue.Queue(), queue.Queue(), stopped)
+
+    start = time.time()
+    with pytest.raises(RuntimeError, match="stopped"):
+        net.predict(np.zeros((8, 8)), 1)
+    assert time.time() - start < 5
+
+
+def test_client_returns_server_answer(short_timeout):
+    responses = queue.Queue()
+    responses.put((np.full((1, 64), 1 / 64.0), np.array([0.5])))
+    net = RemoteNetwork(0, queue.Queue(), responses, threading.Event())
+
+    pi, v = net.predict(np.zeros((8, 8)), 1)
+
+    assert pi.shape == (64,)
+    assert v == 0.5
@@ -0,0 +1,200 @@
+"""Tests of the Monte Carlo Tree Search."""
+import numpy as np
+import pytest
+
+from config import CFG
+from mcts import MonteCarloTreeSearch, TranspositionTable, TreeNode
+from othello.othello_game import OthelloGame
+
+
+class UniformNetwork(object):
+    """A network stub with uniform priors and a constant value."""
+
+    def __init__(self, v=0.1):
+        self.v = v
+        self.calls = 0
+
+    def predict(self, state, current_player=None):
+        self.calls += 1
+        return np.full(64, 1 / 64.0), self.v
+
+    def predict_batch(self, states, current_players=None):
+        self.calls += len(states)
+        return (np.full((len(states), 64), 1 / 64.0),
+                np.full(len(states), self.v))
+
+
+@pytest.fixture
+def search_config():
+    """Restores the search settings changed by a test."""
+    names = ("num_mcts_sims", "endgame_empties", "mcts_batch_size",
+             "mcts_workers", "mcts_parallel", "tt_size")
+    saved = {name: getattr(CFG, name) for name in names}
+    CFG.endgame_empties = 0
+    CFG.mcts_batch_size = 1
+    CFG.mcts_workers = 1
+    CFG.mcts_parallel = "tree"
+    yield
+    for name, value in saved.items():
+        setattr(CFG, name, value)
+
+
+def shared_blocks(tree):
+    """Returns the expanded nodes grouped by their block of children."""
+    blocks = {}
+    for index in range(tree.size):
+        if tree.num_children[index] > 0:
+            blocks.setdefault(int(tree.first_child[index]), []).append(index)
+    return [nodes for nodes in blocks.values() if len(nodes) > 1]
+
+
+def check_visit_counts(tree, extra_visits=False):
+    """Checks that every expansion and backup left a consistent tree.
+
+    Each expanded node has one visit of its own plus its children's, or more
+    when a thread backed it up after another thread expanded it. No virtual
+    loss is left on any node.
+    """
+    for index in range(tree.size):
+        if tree.num_children[index] > 0:
+            children = tree.children(index)
+            child_visits = int(tree.Nsa[children.start:children.stop].sum())
+            if extra_visits:
+                assert tree.Nsa[index] >= child_visits + 1
+            else:
+                assert tree.Nsa[index] == child_visits + 1
+    visited = tree.Nsa[:tree.size] > 0
+    assert np.allclose(tree.Qsa[:tree.size][visited],
+                       tree.Wsa[:tree.size][visited] /
+                       tree.Nsa[:tree.size][visited])
+    assert not tree.Qsa[:tree.size][~visited].any()
+
+
+def test_transposition_table_is_bounded():
+    table = TranspositionTable(2)
+    table.put((1, 1), 10, 0.5)
+    table.put((2, -1), 11, 0.25)
+    assert table.get((1, 1)) == (10, 0.5)
+    table.put((3, 1), 12, 0.0)
+
+    assert table.get((2, -1)) is None
+    assert table.get((3, 1)) == (12, 0.0)
+    assert (table.hits, table.misses) == (2, 1)
+
+
+def test_transposed_nodes_share_children(search_config):
+    CFG.num_mcts_sims = 400
+    CFG.tt_size = 100000
+    net = UniformNetwork()
+    node = TreeNode()
+    MonteCarloTreeSearch(net).search(OthelloGame(), node, 1.0)
+    tree = node.tree
+
+    assert tree.table.hits > 0
+    assert net.calls == tree.table.misses
+    assert net.calls + tree.table.hits == CFG.num_mcts_sims
+    blocks = shared_blocks(tree)
+    assert blocks
+
+    game = OthelloGame()
+    for nodes in blocks:
+        positions = set()
+        for index in nodes:
+            moves = []
+            while index > 0:
+                moves.append(int(tree.action[index]))
+                index = int(tree.parent[index])
+            position = game.clone()
+            for square in reversed(moves):
+                position.play_action(square)
+            positions.add((position.hash, position.current_player))
+        assert len(positions) == 1
+
+
+def test_disabled_table_shares_nothing(search_config):
+    CFG.num_mcts_sims = 400
+    CFG.tt_size = 0
+    net = UniformNetwork()
+    node = TreeNode()
+    MonteCarloTreeSearch(net).search(OthelloGame(), node, 1.0)
+
+    assert node.tree.table.hits == 0
+    assert net.calls == CFG.num_mcts_sims
+    assert not shared_blocks(node.tree)
+
+
+def test_batched_search_removes_virtual_loss(search_config):
+    CFG.num_mcts_sims = 200
+    CFG.mcts_batch_size = 8
+    CFG.tt_size = 0
+    net = UniformNetwork()
+    node = TreeNode()
+    MonteCarloTreeSearch(net).search(OthelloGame(), node, 1.0)
+
+    assert net.calls == CFG.num_mcts_sims
+    assert node.tree.Nsa[0] == CFG.num_mcts_sims
+    check_visit_counts(node.tree)
+
+
+def test_tree_parallel_search_counts_every_visit(search_config):
+    CFG.num_mcts_sims = 200
+    CFG.mcts_workers = 4
+    CFG.tt_size = 0
+    net = UniformNetwork()
+    node = TreeNode()
+    MonteCarloTreeSearch(net).search(OthelloGame(), node, 1.0)
+
+    assert net.calls == CFG.num_mcts_sims
+    assert node.tree.Nsa[0] == CFG.num_mcts_sims
+    check_visit_counts(node.tree, extra_visits=True)
+
+
+def test_root_parallel_search_merges_root_visits(search_config):
+    CFG.num_mcts_sims = 200
+    CFG.mcts_workers = 3
+    CFG.mcts_parallel = "root"
+    CFG.tt_size = 0
+    net = UniformNetwork()
+    node = TreeNode()
+    MonteCarloTreeSearch(net).search(OthelloGame(), node, 1.0)
+    tree = node.tree
+    children = tree.children(0)
+    visits = tree.Nsa[children.start:children.stop]
+
+    # Each worker spends its first simulation on expanding its root.
+    assert net.calls == CFG.num_mcts_sims
+    assert tree.Nsa[0] == CFG.num_mcts_sims
+    assert visits.sum() == CFG.num_mcts_sims - CFG.mcts_workers
+    assert np.allclose(tree.Qsa[children.start:children.stop] * visits,
+                       tree.Wsa[children.start:children.stop])
+
+
+def test_child_visits_is_visit_share(search_config):
+    CFG.num_mcts_sims = 50
+    CFG.tt_size = 0
+    node = TreeNode()
+    MonteCarloTreeSearch(UniformNetwork()).search(OthelloGame(), node, 1.0)
+    tree = node.tree
+    pi = node.child_visits
+
+    assert np.isclose(pi.sum(), 1.0)
+    for child in tree.children(0):
+        assert np.isclose(pi[tree.action[child]],
+                          tree.Nsa[child] / (CFG.num_mcts_sims - 1))
+
+
+def test_unusable_solved_move_falls_back_to_search(search_config,
+                                                   monkeypatch):
+    CFG.num_mcts_sims = 20
+    CFG.endgame_empties = 60
+    game = OthelloGame()
+    # Square 27 is occupied at the start, so the solved move is illegal.
+    monkeypatch.setattr(game, "solve_endgame",
+                        lambda max_empties, solver=None: (27, 0))
+    node = TreeNode()
+    child = MonteCarloTreeSearch(UniformNetwork()).search(game, node, 1.0)
+
+    assert child is not None
+    assert node.tree.Nsa[0] == CFG.num_mcts_sims
+    assert child.action in np.flatnonzero(
+        game.get_legal_moves(game.current_player)[0])
@@ -0,0 +1,28 @@
+"""Tests of the duplicate and transposed game detection."""
+from othello.openings import GameCache
+
+
+def test_repeated_moves_are_duplicates():
+    cache = GameCache()
+    cache.add_game([("a", -1), ("b", -1)], [19, 18])
+
+    assert cache.lookup(("z", -1), [26]) is None
+    assert cache.lookup(("a", 1), [19]) is None
+    assert cache.lookup(("b", -1), [19, 18]) is True
+    assert (cache.skipped, cache.transposed) == (1, 0)
+
+
+def test_transpositions_are_only_counted():
+    cache = GameCache()
+    cache.add_game([("b", -1), ("c", -1)], [19, 18, 17])
+
+    # The opening square 19 comes before the first key.
+    assert cache.lookup(("b", -1), [19, 18]) is True
+    assert cache.lookup(("b", -1), [37, 18]) is False
+    assert (cache.skipped, cache.transposed) == (1, 1)
+
+    # A game which transposed is stored with its own moves.
+    cache.add_game([("d", -1), ("b", -1), ("e", -1)], [37, 44, 18, 20])
+    assert cache.lookup(("d", -1), [37, 44]) is True
+    assert cache.lookup(("e", -1), [37, 44, 18, 20]) is True
+    assert cache.lookup(("b", -1), [37, 44, 18]) is False
@@ -0,0 +1,79 @@
+"""Tests of the Othello move logic."""
+import random
+
+import numpy as np
+
+from othello import zobrist
+from othello.othello_game import OthelloGame
+
+
+def play_random_moves(game, rng, count):
+    """Plays up to count random legal moves and returns the squares."""
+    squares = []
+    for _ in range(count):
+        if game.check_game_over(game.current_player)[0]:
+            break
+        legal_mask, _ = game.get_legal_moves(game.current_player)
+        square = int(rng.choice(np.flatnonzero(legal_mask)))
+        game.play_action(square)
+        squares.append(square)
+    return squares
+
+
+def array_game_at(game):
+    """Returns an array backend game in the position of a game."""
+    array_game = OthelloGame(use_bitboard=False)
+    array_game.state = game.state.copy()
+    array_game.current_player = game.current_player
+    array_game.hash = zobrist.hash_state(array_game.state,
+                                         array_game.current_player)
+    return array_game
+
+
+def test_bitboard_and_array_moves_agree():
+    # The array backend's get_valid_moves and play_action keep the original
+    # single direction search, so play_action_human, which applies the full
+    # rules on the matrix, is the array reference.
+    rng = random.Random(0)
+    for _ in range(10):
+        game = OthelloGame(use_bitboard=True)
+        while not game.check_game_over(game.current_player)[0]:
+            legal_mask, _ = game.get_legal_moves(game.current_player)
+            for square in range(game.action_size):
+                array_game = array_game_at(game)
+                played = array_game.play_action_human(
+                    (1, square // game.column, square % game.column, None))
+                assert (played is not False) == bool(legal_mask[square])
+                if played is not False:
+                    bitboard_game = game.clone()
+                    bitboard_game.play_action(square)
+                    assert np.array_equal(bitboard_game.state,
+                                          array_game.state)
+                    assert bitboard_game.hash == array_game.hash
+
+            game.play_action(int(rng.choice(np.flatnonzero(legal_mask))))
+
+
+def test_undo_action_restores_position():
+    rng = random.Random(1)
+    for use_bitboard in (True, False):
+        for _ in range(10):
+            game = OthelloGame(use_bitboard=use_bitboard)
+            positions = []
+            for _ in range(40):
+                positions.append((game.state.copy(), game.current_player,
+                                  dict(game.bitboards), game.hash))
+                if not play_random_moves(game, rng, 1):
+                    positions.pop()
+                    break
+
+            while positions:
+                state, player, bitboards, position_hash = positions.pop()
+                game.undo_action()
+                assert np.array_equal(game.state, state)
+                assert game.current_player == player
+                assert game.hash == position_hash
+                assert game.hash == zobrist.hash_state(game.state,
+                                                       game.current_player)
+                if use_bitboard:
+                    assert game.bitboards == bitboards
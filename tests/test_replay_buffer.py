@@ -0,0 +1,55 @@
+"""Tests of the on-disk replay buffer."""
+import os
+
+import numpy as np
+
+from replay_buffer import ReplayBuffer
+
+
+def iteration_data(iteration, count=5):
+    """Returns examples marked with their iteration and example number."""
+    data = []
+    for example in range(count):
+        pi = np.zeros(64)
+        pi[example] = 1.0
+        data.append((np.full((8, 8), iteration), pi, 1.0))
+    return data
+
+
+def test_window_keeps_last_iterations(tmp_path):
+    buffer = ReplayBuffer(str(tmp_path), 2, 8, 8, 64)
+    for iteration in range(4):
+        buffer.add(iteration_data(iteration))
+
+    assert len(buffer) == 10
+    assert sorted(os.listdir(str(tmp_path))) == ["iteration_000002.npy",
+                                                 "iteration_000003.npy"]
+    states, pis, vs = buffer.sample()
+    assert sorted(set(states[:, 0, 0].tolist())) == [2, 3]
+    assert states.dtype == pis.dtype == vs.dtype == np.float32
+
+
+def test_reopened_buffer_continues_numbering(tmp_path):
+    buffer = ReplayBuffer(str(tmp_path), 2, 8, 8, 64)
+    for iteration in range(3):
+        buffer.add(iteration_data(iteration))
+
+    reopened = ReplayBuffer(str(tmp_path), 2, 8, 8, 64)
+    assert len(reopened) == 10
+    reopened.add(iteration_data(3))
+    assert sorted(os.listdir(str(tmp_path))) == ["iteration_000002.npy",
+                                                 "iteration_000003.npy"]
+
+
+def test_sample_draws_distinct_examples(tmp_path):
+    buffer = ReplayBuffer(str(tmp_path), 3, 8, 8, 64)
+    for iteration in range(3):
+        buffer.add(iteration_data(iteration))
+
+    states, pis, vs = buffer.sample(7)
+
+    assert len(states) == len(pis) == len(vs) == 7
+    examples = set(zip(states[:, 0, 0].tolist(),
+                       pis.argmax(axis=1).tolist()))
+    assert len(examples) == 7
+    assert len(buffer.sample(100)[0]) == 15
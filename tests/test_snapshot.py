@@ -0,0 +1,54 @@
+"""Tests of the in-memory weight snapshots of the network."""
+import numpy as np
+import pytest
+
+neural_net = pytest.importorskip("neural_net")
+
+from config import CFG
+from othello.othello_game import OthelloGame
+
+
+@pytest.fixture
+def small_config(tmp_path):
+    """Builds small networks which log to a temporary directory."""
+    names = ("resnet_blocks", "epochs", "batch_size", "model_directory")
+    saved = {name: getattr(CFG, name) for name in names}
+    CFG.model_directory = str(tmp_path) + "/"
+    CFG.resnet_blocks = 1
+    CFG.epochs = 2
+    CFG.batch_size = 16
+    yield
+    for name, value in saved.items():
+        setattr(CFG, name, value)
+
+
+def random_examples(count, rng):
+    """Returns random states, search probabilities and results."""
+    states = rng.integers(-1, 2, (count, 8, 8)).astype(np.float32)
+    pis = rng.dirichlet(np.ones(64), count).astype(np.float32)
+    vs = rng.choice([-1.0, 1.0], count).astype(np.float32)
+    return states, pis, vs
+
+
+def test_restore_rolls_back_and_copies_weights(small_config):
+    rng = np.random.default_rng(0)
+    game = OthelloGame()
+    net = neural_net.NeuralNetworkWrapper(game)
+    state = game.state.astype(np.float32)
+    pi, v = net.predict(state, game.current_player)
+    snapshot = net.snapshot()
+
+    net.train_arrays(*random_examples(64, rng))
+    trained_pi, _ = net.predict(state, game.current_player)
+    assert not np.allclose(trained_pi, pi)
+
+    net.restore(snapshot)
+    restored_pi, restored_v = net.predict(state, game.current_player)
+    assert np.allclose(restored_pi, pi, atol=1e-6)
+    assert np.isclose(restored_v, v, atol=1e-6)
+
+    other = neural_net.NeuralNetworkWrapper(game)
+    other.restore(snapshot)
+    copied_pi, copied_v = other.predict(state, game.current_player)
+    assert np.allclose(copied_pi, pi, atol=1e-6)
+    assert np.isclose(copied_v, v, atol=1e-6)
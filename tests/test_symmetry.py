@@ -0,0 +1,28 @@
+"""Tests of the symmetry canonicalization of the evaluation cache."""
+import numpy as np
+import pytest
+
+neural_net = pytest.importorskip("neural_net")
+
+
+def test_restore_policy_inverts_canonicalize():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        state = rng.integers(-1, 2, (8, 8)).astype(np.int8)
+        canonical, symmetry = neural_net.canonicalize(state)
+        restored = neural_net.restore_policy(canonical.flatten(), symmetry,
+                                             8, 8)
+        assert np.array_equal(restored, state.flatten())
+
+
+def test_symmetric_boards_share_canonical_form():
+    rng = np.random.default_rng(1)
+    for _ in range(20):
+        state = rng.integers(-1, 2, (8, 8)).astype(np.int8)
+        canonical, _ = neural_net.canonicalize(state)
+        for symmetry in range(8):
+            candidate = np.rot90(state, symmetry % 4)
+            if symmetry >= 4:
+                candidate = np.fliplr(candidate)
+            assert np.array_equal(neural_net.canonicalize(candidate)[0],
+                                  canonical)
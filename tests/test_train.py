@@ -0,0 +1,52 @@
+"""Tests of the self-play training examples."""
+import numpy as np
+import pytest
+
+from config import CFG
+from othello.othello_game import OthelloGame
+from train import Train
+
+
+class UniformNetwork(object):
+    """A network stub with uniform priors and a zero value."""
+
+    cache = None
+
+    def predict(self, state, current_player=None):
+        return np.full(64, 1 / 64.0), 0.0
+
+
+@pytest.fixture
+def fast_selfplay():
+    """Plays self-play games with few simulations and no records."""
+    names = ("num_mcts_sims", "endgame_empties", "mcts_batch_size",
+             "mcts_workers", "record_games")
+    saved = {name: getattr(CFG, name) for name in names}
+    CFG.num_mcts_sims = 3
+    CFG.endgame_empties = 0
+    CFG.mcts_batch_size = 1
+    CFG.mcts_workers = 1
+    CFG.record_games = 0
+    yield
+    for name, value in saved.items():
+        setattr(CFG, name, value)
+
+
+def test_values_are_results_for_the_player_to_move(fast_selfplay):
+    np.random.seed(0)
+    parities = set()
+    for _ in range(10):
+        game = OthelloGame()
+        training_data = []
+        Train(game, UniformNetwork()).play_game(game, training_data)
+
+        # The first player is -1 and the players alternate.
+        final_score = np.sign(np.sum(game.state))
+        for ply, (_, _, v) in enumerate(training_data):
+            player = -1 if ply % 2 == 0 else 1
+            assert v == player * final_score
+        parities.add(len(training_data) % 2)
+        if len(parities) == 2:
+            break
+
+    assert parities == {0, 1}
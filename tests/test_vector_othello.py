@@ -0,0 +1,60 @@
+"""Tests of the vectorized Othello environment."""
+import random
+
+import numpy as np
+
+from othello.othello_game import OthelloGame
+from othello.vector_othello import VectorOthello
+
+
+def test_vector_othello_matches_othello_game():
+    rng = random.Random(2)
+    num_boards = 16
+    games = [OthelloGame(use_bitboard=True) for _ in range(num_boards)]
+    vector = VectorOthello(num_boards)
+    done = np.zeros(num_boards, dtype=bool)
+
+    while not done.all():
+        legal_mask = vector.legal_mask()
+        game_over, values = vector.check_game_over()
+        states = vector.states()
+        squares = np.full(num_boards, -1)
+
+        for index, game in enumerate(games):
+            if done[index]:
+                continue
+            mask, _ = game.get_legal_moves(game.current_player)
+            assert np.array_equal(mask == 1, legal_mask[index])
+            assert np.array_equal(states[index], game.state)
+            over, value = game.check_game_over(game.current_player)
+            assert (over, value) == (game_over[index], values[index])
+            if over:
+                done[index] = True
+                continue
+            squares[index] = rng.choice(np.flatnonzero(mask))
+            game.play_action(int(squares[index]))
+
+        vector.play(squares)
+
+    for index, game in enumerate(games):
+        restored = vector.to_game(index)
+        assert np.array_equal(restored.state, game.state)
+        assert restored.hash == game.hash
+
+
+def test_from_games_round_trip():
+    rng = random.Random(3)
+    games = []
+    for _ in range(4):
+        game = OthelloGame(use_bitboard=True)
+        for _ in range(10):
+            mask, _ = game.get_legal_moves(game.current_player)
+            game.play_action(int(rng.choice(np.flatnonzero(mask))))
+        games.append(game)
+
+    vector = VectorOthello.from_games(games)
+    for index, game in enumerate(games):
+        restored = vector.to_game(index)
+        assert np.array_equal(restored.state, game.state)
+        assert restored.current_player == game.current_player
+        assert restored.bitboards == game.bitboards
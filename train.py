@@ -1,10 +1,15 @@
 """Class to train the Neural Network."""
+import os
+import time
+
 import numpy as np
 
 from config import CFG
 from mcts import MonteCarloTreeSearch, TreeNode
-from neural_net import NeuralNetworkWrapper
 from evaluate import Evaluate
+from selfplay import ResourceMeter, SelfPlayPool
+from replay_buffer import ReplayBuffer
+from game_records import GameRecordWriter, read_training_data
 from copy import deepcopy
 
 
@@ -14,34 +19,96 @@ class Train(object):
     Attributes:
         game: An object containing the game state.
         net: An object containing the neural network.
+        eval_net: The evaluation network, built when training starts.
+        pool: A SelfPlayPool kept across iterations, or None.
+        replay: A ReplayBuffer with the positions of the last iterations,
+            opened when training starts.
+        records: A GameRecordWriter for the self-play games of this
+            process, opened with the first recorded game.
+        network_id: An integer identifying the network playing self-play
+            games, written to the game records. It counts the accepted
+            networks and is kept next to the best model.
     """
 
     def __init__(self, game, net):
         """Initializes Train with the board state and neural network."""
         self.game = game
         self.net = net
-        self.eval_net = NeuralNetworkWrapper(game)
+        self.eval_net = None
+        self.pool = None
+        self.replay = None
+        self.records = None
+        self.network_id = 0
 
     def start(self):
         """Main training loop."""
+        # Imported here so that self-play workers served by the inference
+        # server never load TensorFlow.
+        from neural_net import NeuralNetworkWrapper, save_calibration_states
+
+        if self.eval_net is None:
+            self.eval_net = NeuralNetworkWrapper(self.game)
+
+        # Opened here rather than in __init__, since self-play workers also
+        # build a Train object.
+        if self.replay is None:
+            self.replay = ReplayBuffer(
+                os.path.join(CFG.model_directory, "replay"),
+                CFG.replay_iterations, self.game.row, self.game.column,
+                self.game.action_size)
+
+            if CFG.import_records:
+                imported, num_games = read_training_data(self.game,
+                                                         CFG.import_records)
+                if imported:
+                    self.replay.add(imported)
+                print("Imported %d examples of %d recorded games"
+                      % (len(imported), num_games))
+        meter = ResourceMeter()
+        self.network_id = self.load_network_id()
+
         for i in range(CFG.num_iterations):
             print("Iteration", i + 1)
 
             training_data = []  # list to store self play states, pis and vs
 
-            for j in range(CFG.num_games):
-                print("Start Training Self-Play Game", j + 1)
-                game = self.game.clone()  # Create a fresh clone for each game.
-                self.play_game(game, training_data)
+            start_time = time.time()
+
+            if CFG.selfplay_workers > 1:
+                self.play_games_parallel(training_data)
+            else:
+                self.net.prepare_inference()
+
+                for j in range(CFG.num_games):
+                    print("Start Training Self-Play Game", j + 1)
+                    game = self.game.clone()  # Create a fresh clone per game.
+                    self.play_game(game, training_data)
+
+                if self.net.cache is not None:
+                    print("Evaluation cache hits:", self.net.cache.hits,
+                          "misses:", self.net.cache.misses,
+                          "hit rate: %.3f" % self.net.cache.hit_rate())
 
-            # Save the current neural network model.
-            self.net.save_model()
+            elapsed = time.time() - start_time
+            print("Self-play: %d games in %.1fs (%.1f games/hour)"
+                  % (CFG.num_games, elapsed,
+                     CFG.num_games * 3600 / max(elapsed, 1e-9)))
 
-            # Load the recently saved model into the evaluator network.
-            self.eval_net.load_model()
+            # Keep some positions to calibrate quantized networks.
+            save_calibration_states(training_data)
 
-            # Train the network using self play values.
-            self.net.train(training_data)
+            # Keep the current weights in memory and copy them into the
+            # evaluator network.
+            snapshot = self.net.snapshot()
+            self.eval_net.restore(snapshot)
+
+            # Train the network on the positions of the last iterations.
+            self.replay.add(training_data)
+            print("Replay buffer: %d examples" % len(self.replay))
+            self.net.train_arrays(*self.replay.sample(CFG.replay_sample))
+
+            self.net.prepare_inference()
+            self.eval_net.prepare_inference()
 
             # Initialize MonteCarloTreeSearch objects for both networks.
             current_mcts = MonteCarloTreeSearch(self.net)
@@ -49,29 +116,90 @@ class Train(object):
 
             evaluator = Evaluate(current_mcts=current_mcts, eval_mcts=eval_mcts,
                                  game=self.game)
-            wins, losses, draws = evaluator.evaluate()
+            if CFG.sprt_gating:
+                accepted, wins, losses, draws = evaluator.gate()
+            else:
+                wins, losses, draws = evaluator.evaluate()
 
-            print("wins:", wins)
-            print("losses:", losses)
-            print("draws:", draws)
+                print("wins:", wins)
+                print("losses:", losses)
+                print("draws:", draws)
 
-            num_games = wins + losses + draws
+                num_games = wins + losses + draws
 
-            if num_games == 0:
-                win_rate = 0
-            else:
-                win_rate = wins / num_games
+                if num_games == 0:
+                    win_rate = 0
+                else:
+                    win_rate = wins / num_games
 
-            print("win rate:", win_rate)
+                print("win rate:", win_rate)
+                accepted = win_rate > CFG.eval_win_rate
 
-            if win_rate > CFG.eval_win_rate:
+            if accepted:
                 # Save current model as the best model.
                 print("New model saved as best model.")
-                self.net.save_model("best_model")
+                self.net.save_model_async("best_model")
+                self.network_id += 1
+                self.save_network_id()
             else:
-                print("New model discarded and previous model loaded.")
+                print("New model discarded and previous model restored.")
                 # Discard current model and use previous best model.
-                self.net.load_model()
+                self.net.restore(snapshot)
+
+        self.net.wait_for_save()
+
+        if self.pool is not None:
+            self.pool.close()
+
+        meter.report(CFG.num_iterations * CFG.num_games)
+
+    def load_network_id(self):
+        """Returns the id of the best model, 0 if none was accepted yet."""
+        file_path = CFG.model_directory + "best_model_id"
+        if not os.path.exists(file_path):
+            return 0
+        with open(file_path) as id_file:
+            return int(id_file.read())
+
+    def save_network_id(self):
+        """Writes the id of the best model next to it."""
+        file_path = CFG.model_directory + "best_model_id"
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        with open(file_path + ".tmp", "w") as id_file:
+            id_file.write(str(self.network_id))
+        os.replace(file_path + ".tmp", file_path)
+
+    def play_games_parallel(self, training_data):
+        """Plays the iteration's self-play games on worker processes.
+
+        The current weights are saved to a checkpoint which every worker
+        loads into its own network.
+
+        Args:
+            training_data: A list to store self play states, pis and vs.
+        """
+        # The previous iteration's best model may still be being saved.
+        self.net.wait_for_save()
+        self.net.save_model("selfplay_model")
+        if CFG.inference_precision != "float32":
+            self.net.export_quantized_model("selfplay_model.tflite")
+        elif CFG.frozen_inference:
+            self.net.export_frozen_model("selfplay_model.pb")
+        model_path = CFG.model_directory + "selfplay_model"
+
+        # The pool is kept so that its workers and inference server keep
+        # running and only reload the weights between iterations.
+        if self.pool is None:
+            self.pool = SelfPlayPool(CFG.selfplay_workers,
+                                     CFG.inference_server)
+        pool = self.pool
+        pool.play(model_path, CFG.num_games, training_data, self.network_id)
+
+        lookups = pool.cache_hits + pool.cache_misses
+        if lookups:
+            print("Evaluation cache hits:", pool.cache_hits,
+                  "misses:", pool.cache_misses,
+                  "hit rate: %.3f" % (pool.cache_hits / lookups))
 
     def play_game(self, game, training_data):
         """Loop for each self-play game.
@@ -88,6 +216,8 @@ class Train(object):
         game_over = False
         value = 0
         self_play_data = []
+        players = []
+        moves = []
         count = 0
 
         node = TreeNode()
@@ -101,11 +231,14 @@ class Train(object):
                 best_child = mcts.search(game, node, CFG.temp_final)
 
             # Store state, prob and v for training.
+            # The policy target is the search's share of visits per move.
             self_play_data.append([deepcopy(game.state),
-                                   deepcopy(best_child.parent.child_psas),
+                                   best_child.parent.child_visits,
                                    0])
+            players.append(game.current_player)
 
             action = best_child.action
+            moves.append(action)
             game.play_action(action)  # Play the child node's action.
             count += 1
 
@@ -114,12 +247,24 @@ class Train(object):
             best_child.parent = None
             node = best_child  # Make the child node the root node.
 
-        # Update v as the value of the game result.
-        for game_state in self_play_data:
-            value = -value
-            game_state[2] = value
+        print("Transposition table hits:", node.tree.table.hits,
+              "misses:", node.tree.table.misses)
+
+        # Update v as the value of the game result for the player to move.
+        for game_state, player in zip(self_play_data, players):
+            game_state[2] = value if player == game.current_player else -value
             self.augment_data(game_state, training_data, game.row, game.column)
 
+        if CFG.record_games and self_play_data:
+            if self.records is None:
+                self.records = GameRecordWriter(
+                    self.game, os.path.join(CFG.model_directory, "games",
+                                            "selfplay_%d.bin" % os.getpid()))
+            self.records.write_game(moves,
+                                    [game_state[1]
+                                     for game_state in self_play_data],
+                                    self_play_data[0][2], self.network_id)
+
     def augment_data(self, game_state, training_data, row, column):
         """Loop for each self-play game.
 